@@ -1,22 +1,31 @@
-import io
+import os
+import re
+import sys
+import runpy
+import shutil
+import zipfile
+import tempfile
 import datetime as dt
 import itertools
 
-from google.cloud import storage
-
 from airflow import models
-from airflow.contrib.hooks.bigquery_hook import BigQueryHook
 from airflow.models import BaseOperator
 from airflow.utils.decorators import apply_defaults
-from airflow.contrib.operators.bigquery_operator import BigQueryOperator
-from airflow.contrib.operators.bigquery_to_gcs import BigQueryToCloudStorageOperator
-from airflow.contrib.operators.kubernetes_pod_operator import KubernetesPodOperator
-
-import pandas as pd
 
 import logging
 
 from fuga.config import get_config
+from fuga.formats import EXPORT_FORMATS
+from fuga.lockfile import find_lockfile, get_image, read_lockfile
+from fuga.shard import (
+    SHARD_COUNT_ENV,
+    SHARD_INDEX_ENV,
+    SHARD_INPUT_PREFIX_ENV,
+    SHARD_OUTPUT_NAME_ENV)
+
+# This module is imported whenever airflow parses DAG files. Modules not
+# needed to define DAGs (pandas, GCS and BigQuery clients, operators not
+# used by the DAG) are imported only in functions using them.
 
 
 logger = logging.getLogger('{{cookiecutter.experiment_name}}')
@@ -27,7 +36,66 @@ sh.setLevel(logging.INFO)
 logger.addHandler(sh)
 
 
+def _prefer_profile_nodes(profile_name):
+    return {
+        'nodeAffinity': {
+            'preferredDuringSchedulingIgnoredDuringExecution': [{
+                'weight': 100,
+                'preference': {
+                    'matchExpressions': [{
+                        'key': 'fuga/resource-profile',
+                        'operator': 'In',
+                        'values': [profile_name]}]}}]}}
+
+
+# Resource profiles of pod operators, which can be overridden and extended
+# with `resource_profiles` in fuga.yml. Nodes labeled with
+# `fuga/resource-profile: <name>` are preferred for pods of the profile.
+RESOURCE_PROFILES = {
+    'small': {
+        'resources': {
+            'request_cpu': '250m',
+            'request_memory': '512Mi',
+            'limit_cpu': '1',
+            'limit_memory': '1Gi'}},
+    'highmem': {
+        'resources': {
+            'request_cpu': '2',
+            'request_memory': '12Gi',
+            'limit_memory': '12Gi'},
+        'affinity': _prefer_profile_nodes('highmem')},
+    'cpu-batch': {
+        'resources': {
+            'request_cpu': '4',
+            'request_memory': '4Gi',
+            'limit_cpu': '4',
+            'limit_memory': '8Gi'},
+        'affinity': _prefer_profile_nodes('cpu-batch')}}
+
+# Experiment configs (fuga.yml) read in the process, keyed by path, with
+# their mtimes
+_experiment_configs = {}
+
+# Datasets known to exist, as (project id, dataset id). Shared by tasks run
+# in the same worker process.
+_existing_datasets = set()
+
+
 class BigQueryMaybeCreateEmptyDatasetOperator(BaseOperator):
+    """Create BigQuery datasets unless they exist.
+
+    Each dataset is looked up directly and created only if it's not found.
+    Datasets found to exist are remembered within the worker process and
+    never looked up again.
+
+    Args:
+        dataset_id (string or list[string]): ID of a dataset, or IDs of
+        datasets to ensure.
+        project_id (string): Project of the datasets. Defaults to the project
+        of the connection.
+        dataset_reference (dict): Dataset resource used to create datasets.
+
+    """
     template_fields = ('dataset_id', 'project_id')
     ui_color = '#f0eee4'
 
@@ -52,53 +120,201 @@ class BigQueryMaybeCreateEmptyDatasetOperator(BaseOperator):
             __init__(*args, **kwargs)
 
     def execute(self, context):
+        from airflow.contrib.hooks.bigquery_hook import BigQueryHook
+        from googleapiclient.errors import HttpError
+
         bq_hook = BigQueryHook(bigquery_conn_id=self.bigquery_conn_id,
                                delegate_to=self.delegate_to)
+        service = bq_hook.get_service()
+        project_id = self.project_id or bq_hook.project_id
+
+        dataset_ids = [self.dataset_id] \
+            if isinstance(self.dataset_id, str) else self.dataset_id
+
+        for dataset_id in dataset_ids:
+            if (project_id, dataset_id) in _existing_datasets:
+                continue
+
+            try:
+                service.datasets().get(
+                    projectId=project_id,
+                    datasetId=dataset_id).execute()
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+
+                self._create_dataset(service, project_id, dataset_id)
+
+            _existing_datasets.add((project_id, dataset_id))
+
+    def _create_dataset(self, service, project_id, dataset_id):
+        from googleapiclient.errors import HttpError
+
+        body = dict(self.dataset_reference)
+        body['datasetReference'] = {
+            'projectId': project_id,
+            'datasetId': dataset_id}
+
+        try:
+            service.datasets().insert(
+                projectId=project_id,
+                body=body).execute()
+            self.log.info('Created dataset %s:%s', project_id, dataset_id)
+        except HttpError as e:
+            # Created by another task in the meantime
+            if e.resp.status != 409:
+                raise
+
+
+def _extract_bundle(bundle_path):
+    stat = os.stat(bundle_path)
+    extract_dir = os.path.join(
+        tempfile.gettempdir(),
+        'fuga_bundles',
+        '{name}-{size}-{mtime}'.format(
+            name=os.path.basename(os.path.dirname(bundle_path)),
+            size=stat.st_size,
+            mtime=stat.st_mtime_ns))
+
+    if not os.path.isdir(extract_dir):
+        tmp_dir = '{}.{}.tmp'.format(extract_dir, os.getpid())
+        with zipfile.ZipFile(bundle_path) as bundle:
+            bundle.extractall(tmp_dir)
+        try:
+            # Rename is atomic so that other processes never see a partially
+            # extracted bundle
+            os.rename(tmp_dir, extract_dir)
+        except OSError:
+            # Another process has extracted the same bundle meanwhile
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return extract_dir
+
+
+# `py` directories of bundles and versions loaded in the process
+_loaded_py_dirs = []
+
+
+def _activate_py_dir(py_dir):
+    """Let DAG files of a bundle or version import modules next to them.
+
+    Modules imported from `py` directories loaded before are purged, and
+    the directory is put first on `sys.path`, so that another version of
+    the experiment, or another experiment with modules of the same names,
+    never resolves imports to those loaded before. Modules already imported
+    by DAG files loaded before keep working, since they hold references to
+    them.
+    """
+    stale_dirs = set(_loaded_py_dirs) | {py_dir}
+    sys.path[:] = [p for p in sys.path if p not in stale_dirs]
+
+    prefixes = tuple(os.path.join(d, '') for d in stale_dirs)
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, '__file__', None)
+        if path is not None and os.path.abspath(path).startswith(prefixes):
+            del sys.modules[name]
+
+    sys.path.insert(0, py_dir)
+    if py_dir not in _loaded_py_dirs:
+        _loaded_py_dirs.append(py_dir)
+
 
-        conn = bq_hook.get_conn()
-        cursor = conn.cursor()
+def _load_dags(root_dir, namespace):
+    py_dir = os.path.abspath(os.path.join(root_dir, 'py'))
+    _activate_py_dir(py_dir)
 
-        datasets = cursor.get_datasets_list(
-            project_id=self.project_id)
-        dataset_ids = list(
-            d['datasetReference']['datasetId'] for d in datasets)
+    for cur_dir, _dirs, files in os.walk(py_dir):
+        for filename in sorted(files):
+            if not filename.endswith('.py'):
+                continue
 
-        if self.dataset_id not in dataset_ids:
-            cursor.create_empty_dataset(
-                project_id=self.project_id,
-                dataset_id=self.dataset_id,
-                dataset_reference=self.dataset_reference)
+            path = os.path.join(cur_dir, filename)
+            module_globals = runpy.run_path(path)
+            for key, value in module_globals.items():
+                if not isinstance(value, models.DAG):
+                    continue
 
+                # DAG is going to be associated with the loader file, keep
+                # its original location available for templates
+                searchpath = value.template_searchpath or []
+                if isinstance(searchpath, str):
+                    searchpath = [searchpath]
+                value.template_searchpath = \
+                    list(searchpath) + [cur_dir, root_dir]
+                namespace['_fuga_{}_{}'.format(filename[:-3], key)] = value
+
+
+def load_bundle(bundle_path, namespace):
+    """Load DAGs from a bundle deployed with `fuga experiment deploy --bundle`.
+
+    The bundle is extracted to a local temporary directory once per bundle
+    version, and DAGs defined in its `py` directory are put into the
+    namespace so that airflow finds them in the loader file.
+
+    Args:
+        bundle_path (string): Path to the bundle archive.
+        namespace (dict): Globals of the loader DAG file.
 
-def save_df(df, name):  # XXX: Function name!!
+    """
+    _load_dags(_extract_bundle(bundle_path), namespace)
+
+
+def load_version(experiment_dir, version, namespace):
+    """Load DAGs of a version deployed with `fuga experiment deploy --versioned`.
+
+    Args:
+        experiment_dir (string): Path to the experiment directory in the DAG
+        folder.
+        version (string): Version id to load.
+        namespace (dict): Globals of the loader DAG file.
+
+    """
+    _load_dags(
+        os.path.join(experiment_dir, '.versions', version),
+        namespace)
+
+
+def save_df(df, name, *args, **kwargs):
     """Save dataframe to GCS.
 
+    See `fuga.gcs.save_df` for other arguments.
+
     Args:
         df (pandas.DataFrame): Dataframe to save.
+        name (string): Name of the output.
 
     Returns:
         key (string): Key of dataframe blob saved to GCS.
 
     """
-    bucket = storage.Client(get_config('gcp_project_name')) \
-        .get_bucket(get_config('bucket_name'))
-    key = '{experiment_name}/output/{date_descriptor}/{name}.csv' \
-        .format(
-            experiment_name=get_config('experiment_name'),
-            date_descriptor='{{ ds_nodash }}',
-            name=name)
+    from fuga import gcs
+
+    return gcs.save_df(df, name, *args, **kwargs)
 
-    blob = bucket.blob(key)
 
-    bio = io.BytesIO()
-    df.to_csv(bio)
-    blob.upload_from_file(bio, rewind=True)
-    return key
+async def save_df_async(df, name, *args, **kwargs):
+    """Save dataframe to GCS without blocking the event loop.
 
+    See `fuga.gcs.save_df` for other arguments.
+
+    Args:
+        df (pandas.DataFrame): Dataframe to save.
+        name (string): Name of the output.
+
+    Returns:
+        key (string): Key of dataframe blob saved to GCS.
 
-def get_exported_table_df(table_name):
+    """
+    from fuga import gcs
+
+    return await gcs.save_df_async(df, name, *args, **kwargs)
+
+
+def get_exported_table_df(table_name, **kwargs):
     """Retrieve exported table file on GCS.
 
+    See `fuga.gcs.get_exported_table_df` for other arguments.
+
     Args:
         table_name (string): Name of the table to load.
 
@@ -106,22 +322,147 @@ def get_exported_table_df(table_name):
         pandas.DataFrame
 
     """
+    from fuga import gcs
+
+    return gcs.get_exported_table_df(
+        table_name,
+        bucket_name=get_config('gcs_bucket_name'),
+        **kwargs)
+
+
+def get_exported_tables_df(table_names, **kwargs):
+    """Retrieve several exported tables on GCS concurrently.
+
+    See `fuga.gcs.get_exported_tables_df` for other arguments.
+
+    Args:
+        table_names (list[string]): Names of the tables to load.
+
+    Returns:
+        dict[string, pandas.DataFrame]: DataFrames keyed by table names.
+
+    """
+    from fuga import gcs
+
+    return gcs.get_exported_tables_df(
+        table_names,
+        bucket_name=get_config('gcs_bucket_name'),
+        **kwargs)
 
-    bucket = storage\
-        .Client(get_config('gcp_project_name'))\
-        .get_bucket(get_config('gcs_bucket_name'))
-    key = \
-        '{experiment_name}/exported_tables/{table_name}/' \
-        '{date_descriptor}/out.csv.gzip'.format(
-            experiment_name=get_config('experiment_name'),
-            table_name=table_name,
-            date_descriptor='{{ ds_nodash }}')
-    blob = storage.Blob(key, bucket)
-    bio = io.BytesIO()
-    blob.download_to_file(bio)
-    bio.seek(0)
 
-    return pd.read_csv(bio, compression='gzip')
+async def get_exported_table_df_async(table_name, **kwargs):
+    """Retrieve exported table file on GCS without blocking the event loop.
+
+    See `fuga.gcs.get_exported_table_df` for other arguments.
+
+    Args:
+        table_name (string): Name of the table to load.
+
+    Returns:
+        pandas.DataFrame
+
+    """
+    from fuga import gcs
+
+    return await gcs.get_exported_table_df_async(
+        table_name,
+        bucket_name=get_config('gcs_bucket_name'),
+        **kwargs)
+
+
+def iter_exported_table(table_name, **kwargs):
+    """Iterate over an exported table on GCS chunk by chunk.
+
+    See `fuga.gcs.iter_exported_table` for other arguments.
+
+    Args:
+        table_name (string): Name of the table to load.
+
+    Yields:
+        pandas.DataFrame: Chunk of the table.
+
+    """
+    from fuga import gcs
+
+    return gcs.iter_exported_table(
+        table_name,
+        bucket_name=get_config('gcs_bucket_name'),
+        **kwargs)
+
+
+class BigQueryToCloudStorageWithSchemaOperator(BaseOperator):
+    """Export a BigQuery table to GCS along with its schema.
+
+    Works like `BigQueryToCloudStorageOperator`, and saves the schema of
+    the source table as `schema.json` next to the exported files, so that
+    readers can type columns without inferring them.
+    """
+    template_fields = ('source_project_dataset_table',
+                       'destination_cloud_storage_uris', 'labels')
+    template_ext = ()
+    ui_color = '#e4e6f0'
+
+    @apply_defaults
+    def __init__(self,
+                 source_project_dataset_table,
+                 destination_cloud_storage_uris,
+                 compression='NONE',
+                 export_format='CSV',
+                 field_delimiter=',',
+                 print_header=True,
+                 bigquery_conn_id='bigquery_default',
+                 delegate_to=None,
+                 labels=None,
+                 *args, **kwargs):
+        super(BigQueryToCloudStorageWithSchemaOperator, self). \
+            __init__(*args, **kwargs)
+
+        self.source_project_dataset_table = source_project_dataset_table
+        self.destination_cloud_storage_uris = destination_cloud_storage_uris
+        self.compression = compression
+        self.export_format = export_format
+        self.field_delimiter = field_delimiter
+        self.print_header = print_header
+        self.bigquery_conn_id = bigquery_conn_id
+        self.delegate_to = delegate_to
+        self.labels = labels
+
+    def execute(self, context):
+        from airflow.contrib.hooks.bigquery_hook import BigQueryHook
+        from fuga import gcs
+
+        self.log.info('Executing extract of %s into: %s',
+                      self.source_project_dataset_table,
+                      self.destination_cloud_storage_uris)
+
+        bq_hook = BigQueryHook(bigquery_conn_id=self.bigquery_conn_id,
+                               delegate_to=self.delegate_to)
+
+        cursor = bq_hook.get_conn().cursor()
+        cursor.run_extract(
+            self.source_project_dataset_table,
+            self.destination_cloud_storage_uris,
+            self.compression,
+            self.export_format,
+            self.field_delimiter,
+            self.print_header,
+            self.labels)
+
+        table_parts = self.source_project_dataset_table \
+            .replace(':', '.').split('.')
+        if len(table_parts) == 2:
+            table_parts.insert(0, bq_hook.project_id)
+        project_id, dataset_id, table_id = table_parts
+
+        table = bq_hook.get_service().tables().get(
+            projectId=project_id,
+            datasetId=dataset_id,
+            tableId=table_id).execute()
+
+        key = gcs.save_export_schema(
+            table['schema']['fields'],
+            self.destination_cloud_storage_uris[0])
+        self.log.info('Saved schema to %s', key)
 
 
 def get_bq_to_bq_operator(
@@ -142,6 +483,8 @@ def get_bq_to_bq_operator(
         airflow.contrib.operators.bigquery_operator.BigQueryOperator
 
     """
+    from airflow.contrib.operators.bigquery_operator import BigQueryOperator
+
     dag = dag or models._CONTEXT_MANAGER_DAG
     if dag is None:
         logger.warning('No DAG context was found. The operator may not be associated to any DAG nor appeared in Web UI')
@@ -207,27 +550,34 @@ def get_maybe_create_dataset_operator(
             "defaultPartitionExpirationMs": str(partition_expiration_seconds * 1000)})
 
 
-def get_export_table_operator(table_name, dag=None):
+def get_export_table_operator(table_name, dag=None, format='csv'):
     """Get templated BigQueryToCloudStorageOperator.
 
+    The schema of the table is saved next to the export, which lets
+    `get_exported_table_df` load columns with explicit types.
+
     Args:
         table_name (string): Name of the table to export.
         dag (airflow.models.DAG): DAG used by context_manager. e.g. `with get_dag() as dag: get_export_table_operator(..., dag=dag)`. Defaults to None.
+        format (string): Format to export in. 'csv' or 'parquet'. Read the
+        export with `get_exported_table_df(..., format=format)`.
+        Defaults to 'csv'.
 
     Returns:
-        airflow.contrib.operators.bigquery_operator.BigQueryOperator
+        BigQueryToCloudStorageWithSchemaOperator
 
     """
     if dag is None:
         logger.warning('No DAG context was found. The operator may not be associated to any DAG nor appeared in Web UI')
 
+    export_format = EXPORT_FORMATS[format]
     date_descriptor = '{{ ds_nodash }}'
     table_name_with_date_descriptor = \
         '{table_name}{date_descriptor}'.format(
             table_name=table_name,
             date_descriptor=date_descriptor)
 
-    return BigQueryToCloudStorageOperator(
+    return BigQueryToCloudStorageWithSchemaOperator(
         dag=dag or models._CONTEXT_MANAGER_DAG,
         task_id='{experiment_name}.{table_name}.export'
         .format(
@@ -238,17 +588,19 @@ def get_export_table_operator(table_name, dag=None):
             gcp_project_name=get_config('gcp_project_name'),
             database_name='%s_database' % get_config('experiment_name'),
             table_name=table_name_with_date_descriptor),
-        # TODO: 1GB以上のデータに対応
+        # Wildcard URI lets BigQuery shard exports larger than 1GB
         # https://cloud.google.com/bigquery/exporting-data-from-bigquery#exportingmultiple
         destination_cloud_storage_uris=[
             'gs://{bucket_name}/{experiment_name}/exported_tables/'
             '{table_name}/{date_descriptor}/'
-            'out.csv.gzip'.format(
+            'out-*{ext}'.format(
                 bucket_name=get_config('bucket_name'),
                 experiment_name=get_config('experiment_name'),
                 date_descriptor=date_descriptor,
-                table_name=table_name)],
-        compression="GZIP")
+                table_name=table_name,
+                ext=export_format['extension'])],
+        export_format=export_format['export_format'],
+        compression=export_format['compression'])
 
 
 def get_dag(start_date=None, schedule_interval=None, **xargs):
@@ -257,7 +609,7 @@ def get_dag(start_date=None, schedule_interval=None, **xargs):
         'retries': 1,
         'email_on_failure': True}
     if models.Variable.get("notification_email_address", None) is not None:
-        defaualt_args['email'] = models.Variable.get("notification_email_address")
+        default_args['email'] = models.Variable.get("notification_email_address")
     default_dag_args = dict(itertools.chain(
         default_args.items(),
         xargs.items()))
@@ -270,18 +622,122 @@ def get_dag(start_date=None, schedule_interval=None, **xargs):
         catchup=False)
 
 
+def _caller_dir():
+    """Get directory of the DAG file calling into this module."""
+    this_file = os.path.abspath(__file__)
+    frame = sys._getframe(1)
+    while frame is not None and \
+            os.path.abspath(frame.f_code.co_filename) == this_file:
+        frame = frame.f_back
+
+    if frame is None:
+        return None
+
+    return os.path.dirname(os.path.abspath(frame.f_code.co_filename))
+
+
+def _get_recorded_image(operator_name):
+    """Get image of a pod operator recorded in the experiment lockfile.
+
+    The lockfile is looked up from the directory of the DAG file, since it's
+    deployed to the root of the experiment along with DAG files.
+    """
+    caller_dir = _caller_dir()
+    if caller_dir is None:
+        return None
+
+    lockfile_path = find_lockfile(caller_dir)
+    if lockfile_path is None:
+        return None
+
+    return get_image(read_lockfile(lockfile_path), operator_name)
+
+
+def _get_experiment_config(directory):
+    """Read fuga.yml of the experiment a directory belongs to."""
+    for _ in range(5):
+        path = os.path.join(directory, 'fuga.yml')
+        if os.path.isfile(path):
+            mtime = os.stat(path).st_mtime_ns
+            cached = _experiment_configs.get(path)
+            if cached is None or cached[0] != mtime:
+                import yaml
+
+                with open(path) as f:
+                    cached = (mtime, yaml.safe_load(f) or {})
+                _experiment_configs[path] = cached
+            return cached[1]
+
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            break
+        directory = parent
+
+    return {}
+
+
+def get_resource_profile(name):
+    """Get a resource profile of pod operators.
+
+    Profiles defined in `resource_profiles` of fuga.yml take precedence
+    over built-in ones (`small`, `highmem` and `cpu-batch`).
+
+    Args:
+        name (string): Name of the profile.
+
+    Returns:
+        dict: Profile with any of `namespace`, `resources`,
+        `node_selectors`, `affinity` and `tolerations`.
+
+    """
+    profiles = dict(RESOURCE_PROFILES)
+    caller_dir = _caller_dir()
+    if caller_dir is not None:
+        profiles.update(
+            _get_experiment_config(caller_dir).get('resource_profiles')
+            or {})
+
+    if name not in profiles:
+        raise Exception(
+            'Unknown resource profile %s. Available profiles: %s'
+            % (name, ', '.join(sorted(profiles))))
+
+    return profiles[name]
+
+
+def _is_mutable_image(image):
+    if '@' in image:
+        return False
+
+    name = image.rsplit('/', 1)[-1]
+    return ':' not in name or name.rsplit(':', 1)[1].lower() == 'latest'
+
+
 def get_kubernetes_pod_operator(
         operator_name=None,
         operator_image=None,
         cmds=['python', 'main.py'],
         env_vars=None,
         dag=None,
-        image_tag=None):
+        image_tag=None,
+        image_pull_policy=None,
+        namespace=None,
+        resource_profile=None,
+        resources=None,
+        node_selectors=None,
+        affinity=None,
+        tolerations=None,
+        task_id=None):
     """Get templated KubernetesPodOperator.
 
     Intended to be used with your own implementations of kuberenetes pod operator
     bootstrapped using `new_pod_operator` command.
 
+    Images deployed with `fuga pod_operator deploy` are pinned by the digest
+    recorded in the experiment lockfile, and pulled only if not present on
+    the node. Without a recorded digest, the `LATEST` tag is pulled on
+    every run.
+
     Args:
         operator_name (string): Name of the operator. Defaults to None. e.g. `train-operator`
         operator_image (string): Name of the operator image. Defaults to None.
@@ -290,10 +746,32 @@ def get_kubernetes_pod_operator(
         cmds (list[str]): Command overrides for the pod.
         env_vars (dict): Env vars overrides for the pod.
         dag (airflow.models.DAG): DAG used by context_manager. e.g. `with get_dag() as dag: get_kuberenetes_pod_operator(..., dag=dag)`. Defaults to None.
+        image_tag (string): Tag of the image to run instead of the recorded
+        digest. Defaults to None.
+        image_pull_policy (string): Pull policy of the image. Defaults to
+        'IfNotPresent' for digests and immutable tags, and 'Always' for
+        `LATEST`.
+        namespace (string): Kubernetes namespace to run the pod in.
+        Defaults to the namespace of the resource profile, or 'default'.
+        resource_profile (string): Name of the resource profile to apply.
+        See `get_resource_profile`. Defaults to None.
+        resources (dict): Resource requests and limits, e.g.
+        `{'request_memory': '4Gi', 'limit_cpu': '2'}`. Merged into those of
+        the resource profile.
+        node_selectors (dict): Node selectors of the pod. Merged into those
+        of the resource profile.
+        affinity (dict): Affinity of the pod. Replaces that of the resource
+        profile.
+        tolerations (list[dict]): Tolerations of the pod. Replace those of
+        the resource profile.
+        task_id (string): Task id of the operator, also used to name pods.
+        Defaults to one made of experiment and operator names.
 
     Returns:
         airflow.contrib.operators.kubernetes_pod_operator.KubernetesPodOperator
     """
+    from airflow.contrib.operators.kubernetes_pod_operator import \
+        KubernetesPodOperator
 
     if dag is None:
         logger.warning('No DAG context was found. The operator may not be associated to any DAG nor appeared in Web UI')
@@ -302,29 +780,155 @@ def get_kubernetes_pod_operator(
             (operator_name is not None and operator_image is not None):
         raise Exception('''You need to specify either one of `opertor_name` or `operator_image` param''')
     elif operator_name is not None:
-        image = 'gcr.io/{gcp_project_name}/{experiment_name}_{operator_name}'\
-            .format(
-                gcp_project_name=get_config('gcp_project_name'),
-                experiment_name=get_config('experiment_name'),
-                operator_name=operator_name)
+        recorded = _get_recorded_image(operator_name) \
+            if image_tag is None else None
+        if recorded is not None:
+            image = '{image}@{digest}'.format(**recorded)
+        else:
+            # Same repository as `fuga pod_operator deploy` pushes to
+            image = 'gcr.io/{gcp_project_name}/{experiment_name}__{operator_name}:{image_tag}'\
+                .format(
+                    gcp_project_name=get_config('gcp_project_name'),
+                    experiment_name=get_config('experiment_name'),
+                    operator_name=operator_name,
+                    image_tag=image_tag or 'LATEST')
     elif operator_image is not None:
         image = operator_image
+        if image_tag is not None:
+            image = '{}:{}'.format(image, image_tag)
+        operator_name = operator_image.rsplit('/', 1)[-1] \
+            .split('@')[0].split(':')[0]
+
+    if image_pull_policy is None:
+        image_pull_policy = 'Always' if _is_mutable_image(image) \
+            else 'IfNotPresent'
+
+    profile = get_resource_profile(resource_profile) \
+        if resource_profile is not None else {}
+    resources = dict(profile.get('resources') or {}, **(resources or {}))
+    node_selectors = dict(
+        profile.get('node_selectors') or {}, **(node_selectors or {}))
 
-    image_tag = image_tag or 'LATEST'
+    task_id = task_id or '{experiment_name}_{operator_name}'.format(
+        experiment_name=get_config('experiment_name').replace('-', '_'),
+        operator_name=operator_name.replace('-', '_'))
 
     return KubernetesPodOperator(
         dag=dag or models._CONTEXT_MANAGER_DAG,
-        task_id='{experiment_name}_{operator_name}'.format(
-            experiment_name=get_config('experiment_name')
-                .replace('-', '_'),
-            operator_name=operator_name.replace('-', '_')),
-        name='{experiment_name}__{operator_name}:{image_tag}'.format(
-            experiment_name=get_config('experiment_name').replace('_', '-'),
-            operator_name=operator_name.replace('_', '-')),
-        namespace='default',
-        # Parameterize tags
+        task_id=task_id,
+        # Pod names must be valid DNS labels
+        name=re.sub(r'[^a-z0-9-]', '-', task_id.lower()),
+        namespace=namespace or profile.get('namespace') or 'default',
         image=image,
-        image_pull_policy='Always',
+        image_pull_policy=image_pull_policy,
         cmds=cmds,
         env_vars=env_vars,
+        resources=resources or None,
+        node_selectors=node_selectors or None,
+        affinity=affinity or profile.get('affinity'),
+        tolerations=tolerations or profile.get('tolerations'),
         startup_timeout_seconds=3600)
+
+
+def _gather_shards(output_name, shard_count, compression, format, **context):
+    from fuga.shard import gather_shard_dfs
+
+    return gather_shard_dfs(
+        output_name,
+        shard_count,
+        date=context['ds_nodash'],
+        compression=compression,
+        format=format)
+
+
+def get_sharded_pod_operators(
+        shard_count,
+        output_name,
+        operator_name=None,
+        operator_image=None,
+        input_prefix=None,
+        compression=None,
+        format='csv',
+        env_vars=None,
+        dag=None,
+        **kwargs):
+    """Get KubernetesPodOperators processing an input in shards and a task
+    merging their outputs.
+
+    Each shard runs in its own pod with `SHARD_INDEX` and `SHARD_COUNT`
+    envvars. Shards pick their part of the input with
+    `fuga.shard.list_shard_blobs` (blobs under `input_prefix`) or
+    `fuga.shard.shard_range` (a range of rows), and save their outputs with
+    `fuga.shard.save_shard_df`. The gather task runs after all shards and
+    saves the concatenated outputs as `output_name` with `save_df`.
+
+    Args:
+        shard_count (int): Number of shards.
+        output_name (string): Name of the merged output.
+        operator_name (string): Name of the operator. See
+        `get_kubernetes_pod_operator`.
+        operator_image (string): Name of the operator image. See
+        `get_kubernetes_pod_operator`.
+        input_prefix (string): GCS prefix of input blobs split across
+        shards, e.g. `gs://bucket/prefix/{{ ds_nodash }}/`. Templated.
+        Defaults to None.
+        compression (string): Compression shards save outputs with. See
+        `save_df`. Defaults to None.
+        format (string): Format shards save outputs in. See `save_df`.
+        Defaults to 'csv'.
+        env_vars (dict): Env vars overrides for the pods.
+        dag (airflow.models.DAG): DAG used by context_manager. e.g. `with get_dag() as dag: get_sharded_pod_operators(..., dag=dag)`. Defaults to None.
+        **kwargs: Arguments passed to `get_kubernetes_pod_operator`, e.g.
+        `cmds` or `resource_profile`.
+
+    Returns:
+        tuple(list[KubernetesPodOperator], PythonOperator): Shard tasks and
+        the gather task.
+
+    """
+    from airflow.operators.python_operator import PythonOperator
+
+    dag = dag or models._CONTEXT_MANAGER_DAG
+    experiment_name = get_config('experiment_name')
+
+    shard_env_vars = {
+        SHARD_COUNT_ENV: str(shard_count),
+        SHARD_OUTPUT_NAME_ENV: output_name,
+        # Let fuga in pods save outputs to the same place
+        'FUGA_EXECUTION_DATE': '{{ ds_nodash }}'}
+    for name in ['experiment_name', 'gcp_project_name', 'bucket_name']:
+        if get_config(name) is not None:
+            shard_env_vars['FUGA_' + name.upper()] = get_config(name)
+    if input_prefix is not None:
+        shard_env_vars[SHARD_INPUT_PREFIX_ENV] = input_prefix
+    shard_env_vars.update(env_vars or {})
+
+    shards = []
+    for i in range(shard_count):
+        shards.append(get_kubernetes_pod_operator(
+            operator_name=operator_name,
+            operator_image=operator_image,
+            env_vars=dict(shard_env_vars, **{SHARD_INDEX_ENV: str(i)}),
+            dag=dag,
+            task_id='{experiment_name}_{output_name}_shard_{index}'.format(
+                experiment_name=experiment_name.replace('-', '_'),
+                output_name=output_name.replace('-', '_'),
+                index=i),
+            **kwargs))
+
+    gather = PythonOperator(
+        dag=dag,
+        task_id='{experiment_name}_{output_name}_gather'.format(
+            experiment_name=experiment_name.replace('-', '_'),
+            output_name=output_name.replace('-', '_')),
+        python_callable=_gather_shards,
+        op_kwargs={
+            'output_name': output_name,
+            'shard_count': shard_count,
+            'compression': compression,
+            'format': format},
+        provide_context=True)
+
+    gather.set_upstream(shards)
+
+    return shards, gather
@@ -4,7 +4,12 @@ from fuga.cli.environment import (
     EnvironmentInitCommand)
 from fuga.cli.experiment import (
     ExperimentNewCommand,
-    ExperimentDeployCommand)
+    ExperimentDeployCommand,
+    ExperimentRollbackCommand)
+from fuga.deploy import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_RESUMABLE_THRESHOLD)
 from fuga.cli.pod_operator import (
     PodOperatorNewCommand,
     PodOperatorDeployCommand)
@@ -62,5 +67,63 @@ def experiment_new(experiment_name, *args, **kwargs):
 
 
 @experiment.command(name='deploy')
-def experiment_deploy(*args, **kwargs):
-    return ExperimentDeployCommand().run(*args, **kwargs)
+@click.option(
+    '--concurrency',
+    type=click.IntRange(min=1),
+    default=DEFAULT_CONCURRENCY,
+    show_default=True,
+    help='Number of files uploaded in parallel.')
+@click.option(
+    '--sync', '--prune', 'sync',
+    is_flag=True,
+    default=False,
+    help='Delete remote files which no longer exist locally.')
+@click.option(
+    '--bundle',
+    is_flag=True,
+    default=False,
+    help='Upload files packed into a single archive with a loader DAG.')
+@click.option(
+    '--watch',
+    is_flag=True,
+    default=False,
+    help='Keep watching local files and upload them on every change.')
+@click.option(
+    '--chunk-size',
+    type=click.IntRange(min=1),
+    default=DEFAULT_CHUNK_SIZE // 1024,
+    show_default=True,
+    help='Chunk size of resumable uploads in KiB. '
+         'Must be a multiple of 256.')
+@click.option(
+    '--resumable-threshold',
+    type=click.IntRange(min=0),
+    default=DEFAULT_RESUMABLE_THRESHOLD // 1024,
+    show_default=True,
+    help='Files larger than this size in KiB are uploaded in chunks '
+         'and resumed by the next deploy if interrupted.')
+@click.option(
+    '--gzip', 'gzip_text',
+    is_flag=True,
+    default=False,
+    help='Upload text files with `Content-Encoding: gzip`. GCS serves '
+         'them decompressed to clients supporting decompressive '
+         'transcoding.')
+@click.option(
+    '--versioned',
+    is_flag=True,
+    default=False,
+    help='Upload files as a new version and switch to it atomically. '
+         'Previous versions can be restored with `fuga experiment rollback`.')
+def experiment_deploy(chunk_size, resumable_threshold, *args, **kwargs):
+    return ExperimentDeployCommand().run(
+        *args,
+        chunk_size=chunk_size * 1024,
+        resumable_threshold=resumable_threshold * 1024,
+        **kwargs)
+
+
+@experiment.command(name='rollback')
+@click.argument('version')
+def experiment_rollback(version):
+    return ExperimentRollbackCommand().run(version)
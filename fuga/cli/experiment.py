@@ -1,17 +1,48 @@
-import glob
 import json
 import os
 import sys
-import re
+import tempfile
+import time
 from urllib.parse import urlparse
 
 import click
 
 from google.cloud import storage
 from fuga.utils import find_experiment_root_dir
+from fuga.ignore import IgnoreMatcher
+from fuga.deploy import (
+    BUNDLE_LOADER_NAME,
+    BUNDLE_NAME,
+    CHUNK_SIZE_MULTIPLE,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_RESUMABLE_THRESHOLD,
+    MANIFEST_NAME,
+    VERSION_LOADER_NAME,
+    VERSIONS_DIR,
+    UploadSessionStore,
+    build_bundle,
+    build_manifest,
+    copy_blobs,
+    delete_blobs,
+    iter_changes,
+    list_remote_md5s,
+    list_versions,
+    load_remote_manifest,
+    manifest_md5s,
+    plan_uploads,
+    read_current_version,
+    save_remote_manifest,
+    switch_version,
+    upload_files,
+    version_id,
+    version_prefix,
+    write_bundle_loader)
 from fuga.google.cloud import composer
 from fuga.config import get_config
 from fuga.experiment import Experiment
+from fuga.http import configure_connection_pool
+from fuga.lockfile import LOCKFILE_NAME
 from cookiecutter.main import cookiecutter
 from cookiecutter.exceptions import (
     OutputDirExistsException,
@@ -84,68 +115,549 @@ class ExperimentNewCommand:
             sys.exit(1)
 
 
+def _get_dag_bucket(storage_client):
+    """Get DAG bucket and prefix of the configured Composer environment."""
+    composer_client = composer.Client()
+    environment = composer_client.get_environment(
+        get_config('composer_environment_full_path'))
+
+    if environment.state != 'RUNNING':
+        raise Exception(
+            'Composer environment %s is in invalid state %s.\n'
+            'You need to wait until the environment is running '
+            'or fix it if it\'s broken.' % (
+                environment.name,
+                environment.state))
+
+    if not environment.config.get('dagGcsPrefix', None):
+        raise Exception(
+            'Missing dagGcsPrefix config with environment %s.\n'
+            'The environment may be in an invalid state or '
+            'failed to launch.' % (
+                environment.name))
+
+    bucket_url = urlparse(environment.config['dagGcsPrefix'])
+    bucket_name = bucket_url.netloc
+    bucket_prefix = bucket_url.path[1:]  # omit slash
+
+    return storage_client.get_bucket(bucket_name), bucket_prefix
+
+
 class ExperimentDeployCommand:
-    _DEFAULT_IGNORE = ['.*/.git/.*']
+    _TARGETS = ['py', 'sql', 'pod_operators']
+    # Files at the experiment root read by DAG files, e.g. to pin images of
+    # pod operators
+    _ROOT_FILES = ['fuga.yml', LOCKFILE_NAME]
+
+    def run(
+            self,
+            concurrency=DEFAULT_CONCURRENCY,
+            sync=False,
+            bundle=False,
+            watch=False,
+            chunk_size=DEFAULT_CHUNK_SIZE,
+            resumable_threshold=DEFAULT_RESUMABLE_THRESHOLD,
+            gzip_text=False,
+            versioned=False):
+        if bundle and watch:
+            raise click.UsageError(
+                '--bundle and --watch cannot be used together')
+        if versioned and (bundle or watch):
+            raise click.UsageError(
+                '--versioned cannot be used with --bundle or --watch')
+        if chunk_size <= 0 or chunk_size % CHUNK_SIZE_MULTIPLE != 0:
+            raise click.UsageError(
+                'Chunk size must be a multiple of %d bytes'
+                % CHUNK_SIZE_MULTIPLE)
+
+        self._upload_options = {
+            'chunk_size': chunk_size,
+            'resumable_threshold': resumable_threshold,
+            'sessions': UploadSessionStore(),
+            'gzip_text': gzip_text}
 
-    def run(self):
         experiment_root_dir = find_experiment_root_dir()
         experiment = Experiment.from_path(experiment_root_dir)
         storage_client = storage.Client()
-        composer_client = composer.Client()
-        environment = composer_client.get_environment(
-            get_config('composer_environment_full_path'))
+        configure_connection_pool(storage_client, concurrency)
+        bucket, bucket_prefix = _get_dag_bucket(storage_client)
+        experiment_prefix = os.path.join(bucket_prefix, experiment.name)
 
-        if environment.state != 'RUNNING':
-            raise Exception(
-                'Composer environment %s is in invalid state %s.\n'
-                'You need to wait until the environment is running '
-                'or fix it if it\'s broken.' % (
-                    environment.name,
-                    environment.state))
-
-        if not environment.config.get('dagGcsPrefix', None):
-            raise Exception(
-                'Missing dagGcsPrefix config with environment %s.\n'
-                'The environment may be in an invalid state or '
-                'failed to launch.' % (
-                    environment.name))
-
-        bucket_url = urlparse(environment.config['dagGcsPrefix'])
-        bucket_name = bucket_url.netloc
-        bucket_prefix = bucket_url.path[1:]  # omit slash
-        bucket = storage_client.get_bucket(bucket_name)
+        # Read .gitignore/.fugaignore once and prune ignored directories
+        # while walking the targets
+        ignore = IgnoreMatcher.from_directory(experiment_root_dir)
 
         pairs = []
-        for target in ['py', 'sql', 'pod_operators']:
-            for local_path in glob.iglob(
-                    os.path.join(experiment_root_dir, target, '**/*'),
-                    recursive=True):
-                if self._is_ignored(local_path):
-                    continue
+        for target in ExperimentDeployCommand._TARGETS:
+            for local_path in ignore.walk(
+                    experiment_root_dir,
+                    os.path.join(experiment_root_dir, target)):
                 remote_path = os.path.join(
-                    bucket_prefix,
-                    experiment.name,
+                    experiment_prefix,
                     local_path[len(experiment_root_dir) + 1:])
                 pairs.append((local_path, remote_path))
 
-        click.echo('''
-Following files are going to uploaded to GCS bucket %s
-''' % bucket_name)
+        for filename in ExperimentDeployCommand._ROOT_FILES:
+            local_path = os.path.join(experiment_root_dir, filename)
+            if os.path.isfile(local_path) and not ignore.is_ignored(filename):
+                pairs.append((
+                    local_path,
+                    os.path.join(experiment_prefix, filename)))
+
+        if versioned:
+            self._deploy_version(
+                storage_client,
+                bucket,
+                experiment_prefix,
+                pairs,
+                concurrency=concurrency,
+                sync=sync)
+        elif bundle:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                self._deploy(
+                    storage_client,
+                    bucket,
+                    experiment_prefix,
+                    self._bundle_pairs(pairs, experiment_prefix, tmp_dir),
+                    concurrency=concurrency,
+                    sync=sync)
+        else:
+            manifest = self._deploy(
+                storage_client,
+                bucket,
+                experiment_prefix,
+                pairs,
+                concurrency=concurrency,
+                sync=sync)
+
+            if watch:
+                self._watch(
+                    storage_client,
+                    bucket,
+                    ignore,
+                    experiment_root_dir,
+                    experiment_prefix,
+                    manifest,
+                    concurrency=concurrency,
+                    sync=sync)
+
+    def _deploy_version(
+            self,
+            storage_client,
+            bucket,
+            experiment_prefix,
+            pairs,
+            concurrency=DEFAULT_CONCURRENCY,
+            sync=False):
+        """Deploy files as a new version and switch the loader to it.
+
+        Files unchanged from the current version are copied on the server
+        side. The loader DAG file is switched only after every file of the
+        version has been deployed. Files of a previous plain or bundle
+        deploy are deleted after the switch.
+        """
+        local_manifest = build_manifest(pairs, experiment_prefix)
+        version = version_id(local_manifest)
+        new_prefix = version_prefix(experiment_prefix, version)
+        current_version = read_current_version(bucket, experiment_prefix)
+
+        # Without a loader, blobs outside versions are left by a plain or
+        # bundle deploy and would be parsed along with the version
+        stales = []
+        if sync or current_version is None:
+            keeps = [
+                os.path.join(experiment_prefix, VERSIONS_DIR) + '/',
+                os.path.join(experiment_prefix, VERSION_LOADER_NAME),
+                os.path.join(experiment_prefix, '.airflowignore')]
+            stales = sorted(
+                r for r in list_remote_md5s(bucket, experiment_prefix + '/')
+                if not any(r.startswith(k) for k in keeps))
+
+        if version == current_version and len(stales) == 0:
+            click.echo(
+                'Version %s is already deployed. Nothing to upload.'
+                % version)
+            return
+
+        uploads = []
+        copies = []
+        if load_remote_manifest(bucket, new_prefix) is None:
+            current_manifest = None
+            if current_version is not None:
+                current_manifest = load_remote_manifest(
+                    bucket, version_prefix(experiment_prefix, current_version))
+            current_files = (current_manifest or {}).get('files', {})
+
+            for local_path, remote_path in pairs:
+                relative_path = os.path.relpath(remote_path, experiment_prefix)
+                current_entry = current_files.get(relative_path)
+                if current_entry is not None and current_entry['md5'] == \
+                        local_manifest['files'][relative_path]['md5']:
+                    copies.append((
+                        os.path.join(
+                            version_prefix(experiment_prefix, current_version),
+                            relative_path),
+                        os.path.join(new_prefix, relative_path)))
+                else:
+                    uploads.append((
+                        local_path,
+                        os.path.join(new_prefix, relative_path)))
+
         click.echo(
-            '\n'.join(
-                '\t%s to %s'
-                % (l, r) for l, r in pairs))
+            'Deploying version %s (current version: %s) to GCS bucket %s\n'
+            '\t%d files to upload, %d unchanged files to copy from the '
+            'current version' % (
+                version,
+                current_version,
+                bucket.name,
+                len(uploads),
+                len(copies)))
+        if len(stales) > 0:
+            click.echo('Following files are going to be deleted')
+            click.echo('\n'.join('\t%s' % r for r in stales))
 
         click.echo('')
         click.confirm('Do you want to conitnue?', abort=True)
 
-        for l, r in pairs:
-            new_blob = bucket.blob(r)
-            new_blob.upload_from_filename(l)
+        started_at = time.time()
+        uploaded, uploaded_bytes, errors = upload_files(
+            bucket,
+            uploads,
+            concurrency=concurrency,
+            on_complete=self._echo_upload_result,
+            **self._upload_options)
+        copied, _copied_bytes, copy_errors = copy_blobs(
+            bucket, copies, concurrency=concurrency)
+        errors += copy_errors
+
+        click.echo(
+            '\nUploaded %d files (%d bytes) and copied %d files '
+            'in %.1f seconds' % (
+                len(uploaded),
+                uploaded_bytes,
+                len(copied),
+                time.time() - started_at))
+
+        if len(errors) > 0:
+            click.echo('Failed to deploy %d files:' % len(errors))
+            click.echo(
+                '\n'.join(
+                    '\t%s (%s)' % (pair[0], e) for pair, e in errors))
+            click.echo(
+                'Version %s is left incomplete. '
+                'Current version is still %s.' % (version, current_version))
+            sys.exit(1)
+
+        # Manifest marks the version as complete
+        save_remote_manifest(bucket, new_prefix, local_manifest)
+        switch_version(bucket, experiment_prefix, version)
+        click.echo('Switched to version %s' % version)
+        if current_version is not None:
+            click.echo(
+                'Run `fuga experiment rollback %s` to roll back'
+                % current_version)
+
+        if len(stales) > 0:
+            deleted, delete_errors = delete_blobs(
+                storage_client, bucket, stales)
+            click.echo('Deleted %d stale files.' % len(deleted))
+            self._echo_delete_errors(delete_errors)
+
+    def _bundle_pairs(self, pairs, experiment_prefix, tmp_dir):
+        """Pack files into a single archive with a loader DAG file."""
+        bundle_path = os.path.join(tmp_dir, BUNDLE_NAME)
+        loader_path = os.path.join(tmp_dir, BUNDLE_LOADER_NAME)
+        build_bundle(pairs, experiment_prefix, bundle_path)
+        write_bundle_loader(loader_path)
+        click.echo(
+            'Packed %d files into %s (%d bytes)' % (
+                len(pairs), BUNDLE_NAME, os.path.getsize(bundle_path)))
+
+        return [
+            (bundle_path, os.path.join(experiment_prefix, BUNDLE_NAME)),
+            (loader_path, os.path.join(experiment_prefix, BUNDLE_LOADER_NAME))]
+
+    def _switched_stales(self, experiment_prefix, pairs, remote_paths):
+        """List blobs left by a deploy of another mode.
+
+        The mode of the previous deploy is told by its loader DAG file in
+        `remote_paths`. Switching to a bundle deletes everything but the
+        bundle, and switching to plain files deletes the loader of a bundle
+        or versions so that DAGs are not parsed twice.
+        """
+        bundle_paths = {
+            os.path.join(experiment_prefix, BUNDLE_NAME),
+            os.path.join(experiment_prefix, BUNDLE_LOADER_NAME)}
+        version_loader_path = os.path.join(
+            experiment_prefix, VERSION_LOADER_NAME)
+        paths = set(r for _l, r in pairs)
+
+        if bundle_paths <= paths:
+            if version_loader_path not in remote_paths \
+                    and bundle_paths <= set(remote_paths):
+                return []
+            return sorted(
+                set(remote_paths)
+                - paths
+                - {os.path.join(experiment_prefix, MANIFEST_NAME)})
+
+        return sorted(
+            (bundle_paths | {version_loader_path})
+            & (set(remote_paths) - paths))
+
+    def _deploy(
+            self,
+            storage_client,
+            bucket,
+            experiment_prefix,
+            pairs,
+            concurrency=DEFAULT_CONCURRENCY,
+            sync=False):
+        # Compare against the manifest written by the previous deploy so
+        # that unchanged files are not uploaded again. Fall back to remote
+        # MD5 digests fetched with one prefix listing if there's none.
+        # With sync, the prefix is listed anyway, and the listing also
+        # catches blobs changed or deleted outside fuga.
+        remote_manifest = load_remote_manifest(bucket, experiment_prefix)
+        local_manifest = build_manifest(
+            pairs, experiment_prefix, previous=remote_manifest)
+
+        if remote_manifest is None or sync:
+            listed_md5s = list_remote_md5s(bucket, experiment_prefix + '/')
+            remote_md5s = listed_md5s
+        else:
+            remote_md5s = manifest_md5s(remote_manifest, experiment_prefix)
+
+        uploads, skips, skipped_bytes = plan_uploads(
+            pairs,
+            manifest_md5s(local_manifest, experiment_prefix),
+            remote_md5s)
+
+        stales = []
+        if sync:
+            stales = sorted(
+                set(listed_md5s)
+                - set(r for _l, r in pairs)
+                - {os.path.join(experiment_prefix, MANIFEST_NAME)})
+        else:
+            stales = self._switched_stales(
+                experiment_prefix, pairs, remote_md5s)
+
+        if len(skips) > 0:
+            click.echo(
+                'Skipping %d unchanged files (%d bytes saved)'
+                % (len(skips), skipped_bytes))
+
+        if len(uploads) == 0 and len(stales) == 0:
+            click.echo('Everything is up to date. Nothing to upload.')
+            if remote_manifest != local_manifest:
+                save_remote_manifest(
+                    bucket, experiment_prefix, local_manifest)
+            return local_manifest
+
+        if len(uploads) > 0:
+            click.echo('''
+Following files are going to uploaded to GCS bucket %s
+''' % bucket.name)
+            click.echo(
+                '\n'.join(
+                    '\t%s to %s'
+                    % (l, r) for l, r in uploads))
+
+        if len(stales) > 0:
+            click.echo('''
+Following files are going to be deleted from GCS bucket %s
+''' % bucket.name)
+            click.echo('\n'.join('\t%s' % r for r in stales))
+
+        click.echo('')
+        click.confirm('Do you want to conitnue?', abort=True)
+
+        started_at = time.time()
+        uploaded, uploaded_bytes, errors = upload_files(
+            bucket,
+            uploads,
+            concurrency=concurrency,
+            on_complete=self._echo_upload_result,
+            **self._upload_options)
+
+        click.echo(
+            '\nUploaded %d files (%d bytes) in %.1f seconds'
+            % (len(uploaded), uploaded_bytes, time.time() - started_at))
+
+        # Keep entries of the previous deploy for files failed to upload so
+        # that they are retried next time.
+        for (_local_path, remote_path), _e in errors:
+            relative_path = os.path.relpath(remote_path, experiment_prefix)
+            local_manifest['files'].pop(relative_path)
+            if remote_manifest is not None \
+                    and relative_path in remote_manifest['files']:
+                local_manifest['files'][relative_path] = \
+                    remote_manifest['files'][relative_path]
+        # Stale files are not deleted on errors. Keep the previous manifest
+        # then so that a switch of deploy modes is detected again.
+        if len(errors) == 0 or len(stales) == 0:
+            save_remote_manifest(bucket, experiment_prefix, local_manifest)
+
+        if len(errors) > 0:
+            click.echo('Failed to upload %d files:' % len(errors))
+            click.echo(
+                '\n'.join(
+                    '\t%s (%s)' % (pair[0], e) for pair, e in errors))
+            if len(stales) > 0:
+                click.echo('Skipped deleting stale files.')
+            sys.exit(1)
+
+        if len(stales) > 0:
+            deleted, delete_errors = delete_blobs(
+                storage_client, bucket, stales)
+            click.echo(
+                'Deleted %d stale files. Airflow scheduler will no longer '
+                'parse %d DAG files.' % (
+                    len(deleted),
+                    len([r for r in deleted if r.endswith('.py')])))
+            self._echo_delete_errors(delete_errors)
+
+        return local_manifest
+
+    def _watch(
+            self,
+            storage_client,
+            bucket,
+            ignore,
+            experiment_root_dir,
+            experiment_prefix,
+            manifest,
+            concurrency=DEFAULT_CONCURRENCY,
+            sync=False):
+        """Keep uploading changed files until interrupted."""
+        directories = [
+            os.path.join(experiment_root_dir, target)
+            for target in ExperimentDeployCommand._TARGETS
+            if os.path.isdir(os.path.join(experiment_root_dir, target))]
+        click.echo('\nWatching changes in %s (Ctrl-C to stop)'
+                   % ', '.join(directories))
+
+        try:
+            for changed_paths in iter_changes(directories):
+                pairs = []
+                removed = []
+                for local_path in sorted(changed_paths):
+                    if ignore.is_ignored(
+                            os.path.relpath(local_path, experiment_root_dir)):
+                        continue
+                    remote_path = os.path.join(
+                        experiment_prefix,
+                        local_path[len(experiment_root_dir) + 1:])
+                    if os.path.isfile(local_path):
+                        pairs.append((local_path, remote_path))
+                    elif not os.path.exists(local_path):
+                        removed.append(remote_path)
+
+                self._deploy_changes(
+                    storage_client,
+                    bucket,
+                    experiment_prefix,
+                    manifest,
+                    pairs,
+                    removed if sync else [],
+                    concurrency=concurrency)
+        except KeyboardInterrupt:
+            click.echo('Stopped watching.')
+
+    def _deploy_changes(
+            self,
+            storage_client,
+            bucket,
+            experiment_prefix,
+            manifest,
+            pairs,
+            removed,
+            concurrency=DEFAULT_CONCURRENCY):
+        """Upload changed files and delete removed ones without confirmation.
+
+        `manifest` is updated in place to reflect the remote state.
+        """
+        changes = build_manifest(pairs, experiment_prefix, previous=manifest)
+        uploads, _skips, _skipped_bytes = plan_uploads(
+            pairs,
+            manifest_md5s(changes, experiment_prefix),
+            manifest_md5s(manifest, experiment_prefix))
+        removed = [
+            r for r in removed
+            if os.path.relpath(r, experiment_prefix) in manifest['files']]
+
+        if len(uploads) == 0 and len(removed) == 0:
+            return
+
+        uploaded, uploaded_bytes, errors = upload_files(
+            bucket,
+            uploads,
+            concurrency=concurrency,
+            on_complete=self._echo_upload_result,
+            **self._upload_options)
+        for _local_path, remote_path in uploaded:
+            relative_path = os.path.relpath(remote_path, experiment_prefix)
+            manifest['files'][relative_path] = changes['files'][relative_path]
+
+        # Entries of blobs failed to delete are kept so that they are
+        # retried on the next change
+        deleted, delete_errors = delete_blobs(
+            storage_client, bucket, removed)
+        for remote_path in deleted:
+            click.echo('\tdeleted %s' % remote_path)
+            manifest['files'].pop(
+                os.path.relpath(remote_path, experiment_prefix))
+        for remote_path, e in delete_errors:
+            click.echo('\tfailed to delete %s (%s)' % (remote_path, e))
+
+        save_remote_manifest(bucket, experiment_prefix, manifest)
+        click.echo(
+            '[%s] Uploaded %d files (%d bytes), deleted %d files, '
+            '%d failed' % (
+                time.strftime('%H:%M:%S'),
+                len(uploaded),
+                uploaded_bytes,
+                len(deleted),
+                len(errors) + len(delete_errors)))
+
+    def _echo_upload_result(self, local_path, remote_path, error):
+        if error is None:
+            click.echo('\tuploaded %s' % local_path)
+        else:
+            click.echo('\tfailed %s' % local_path)
+
+    def _echo_delete_errors(self, errors):
+        if len(errors) > 0:
+            click.echo('Failed to delete %d stale files:' % len(errors))
+            click.echo(
+                '\n'.join('\t%s (%s)' % (name, e) for name, e in errors))
+
+
+class ExperimentRollbackCommand:
+    def run(self, version):
+        experiment = Experiment.from_path(find_experiment_root_dir())
+        storage_client = storage.Client()
+        bucket, bucket_prefix = _get_dag_bucket(storage_client)
+        experiment_prefix = os.path.join(bucket_prefix, experiment.name)
+
+        if load_remote_manifest(
+                bucket, version_prefix(experiment_prefix, version)) is None:
+            raise Exception(
+                'Version %s of experiment %s is not found or incomplete.\n'
+                'Deployed versions: %s' % (
+                    version,
+                    experiment.name,
+                    ', '.join(list_versions(bucket, experiment_prefix))))
 
-    def _is_ignored(self, path):
-        ignores = ExperimentDeployCommand._DEFAULT_IGNORE
+        current_version = read_current_version(bucket, experiment_prefix)
+        if version == current_version:
+            click.echo('Version %s is already the current version.' % version)
+            return
 
-        return any(
-            re.match(ignore, path)
-            for ignore in ignores)
+        click.confirm(
+            'Switch experiment %s from version %s to %s?' % (
+                experiment.name, current_version, version),
+            abort=True)
+        switch_version(bucket, experiment_prefix, version)
+        click.echo('Switched to version %s' % version)
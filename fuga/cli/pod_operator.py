@@ -22,6 +22,7 @@ from cookiecutter.exceptions import (
 from fuga.utils import find_experiment_root_dir
 from fuga.experiment import Experiment
 from fuga.config import get_config
+from fuga.lockfile import LOCKFILE_NAME, record_image
 
 OPERATOR_DIR_PREFIX = os.getenv('FUGA_OPERATOR_DIR_PREFIX', 'operators')
 DEFAULT_REMOTE_CONTAINER_REPO_HOST = 'gcr.io'
@@ -92,6 +93,21 @@ class PodOperatorNewCommand:
             sys.exit(1)
 
 
+def _push_image(client, tag):
+    """Push an image and return its digest reported by the registry."""
+    digest = None
+    for event in client.images.push(tag, stream=True, decode=True):
+        if 'error' in event:
+            raise Exception(
+                f'Failed to push {tag}: {event["error"]}')
+        digest = event.get('aux', {}).get('Digest', digest)
+
+    if digest is None:
+        raise Exception(f'Could not get digest of pushed image {tag}')
+
+    return digest
+
+
 class PodOperatorDeployCommand:
     def run(
             self,
@@ -114,8 +130,13 @@ class PodOperatorDeployCommand:
 
         try:
             repo = Repo(find_experiment_root_dir())
-            if len(repo.head.commit.diff(None)) > 0 \
-                    or len(repo.untracked_files) > 0:
+            # Lockfile is updated by deployments themselves
+            diffs = [
+                d for d in repo.head.commit.diff(None)
+                if LOCKFILE_NAME not in (d.a_path, d.b_path)]
+            untracked_files = [
+                f for f in repo.untracked_files if f != LOCKFILE_NAME]
+            if len(diffs) > 0 or len(untracked_files) > 0:
                 import sys
                 click.echo(
                     'Current Git working tree has either '
@@ -147,9 +168,8 @@ class PodOperatorDeployCommand:
             os.path.join(
                 DEFAULT_REMOTE_CONTAINER_REPO_HOST,
                 get_config('gcp_project_id'))
-        remote_tag = os.path.join(
-            remote_container_repo,
-            f'{image_name}:{version_tag}')
+        remote_image = os.path.join(remote_container_repo, image_name)
+        remote_tag = f'{remote_image}:{version_tag}'
         image.tag(remote_tag)
         latest_tag = os.path.join(
             remote_container_repo,
@@ -158,6 +178,14 @@ class PodOperatorDeployCommand:
         click.echo(f'Pushing images to {remote_container_repo}')
         click.echo('\t' + remote_tag)
         click.echo('\t' + latest_tag)
-        client.images.push(remote_tag)
-        client.images.push(latest_tag)
+        digest = _push_image(client, remote_tag)
+        _push_image(client, latest_tag)
         click.echo('Done')
+
+        lockfile_path = os.path.join(experiment.root_path, LOCKFILE_NAME)
+        record_image(
+            lockfile_path, operator_name, remote_image, version_tag, digest)
+        click.echo(
+            f'Recorded {remote_image}@{digest} in {LOCKFILE_NAME}.\n'
+            'Deploy the experiment to run pods with this image, and commit '
+            f'{LOCKFILE_NAME} to keep track of it.')
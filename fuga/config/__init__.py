@@ -1,49 +1,73 @@
-import json
 import os
 import copy
-
-import yaml
-import click
+import threading
 
 DEFAULT_CONFIG = {
     'cookiecutters_dir': os.path.expanduser('~/.cookiecutters')
 }
 
-_config = copy.deepcopy(DEFAULT_CONFIG)
+# Config is loaded on first access rather than at import time, so that
+# importing fuga (e.g. from DAG files parsed by airflow scheduler) doesn't
+# touch the file system
+_config = None
+_config_lock = threading.Lock()
+
+
+def get_fuga_home():
+    if 'FUGA_HOME' in os.environ:
+        fuga_home = os.environ['FUGA_HOME']
+    else:
+        fuga_base_dir = os.path.expanduser('~')
+        if not os.access(fuga_base_dir, os.W_OK):
+            fuga_base_dir = '/tmp'
+        fuga_home = os.path.join(fuga_base_dir, '.fuga')
+
+    if not os.path.exists(fuga_home):
+        os.makedirs(fuga_home, exist_ok=True)
+
+    return fuga_home
+
 
-if 'FUGA_HOME' in os.environ:
-    _fuga_home = os.environ['FUGA_HOME']
-else:
-    _fuga_base_dir = os.path.expanduser('~')
-    if not os.access(_fuga_base_dir, os.W_OK):
-        _fuga_base_dir = '/tmp'
-    _fuga_home = os.path.join(_fuga_base_dir, '.fuga')
+def _get_config_path():
+    return os.path.expanduser(os.path.join(get_fuga_home(), 'config.yml'))
 
-if not os.path.exists(_fuga_home):
-    os.makedirs(_fuga_home)
 
-_config_path = os.path.expanduser(os.path.join(_fuga_home, 'config.yml'))
+def _load_config():
+    global _config
 
-if os.path.exists(_config_path):
-    try:
-        with open(_config_path) as f:
-            _config = yaml.load(f)
-    except ValueError:
-        _config = {}
+    with _config_lock:
+        if _config is not None:
+            return _config
 
-if not os.path.exists(_config_path):
-    _config = {
-        'gcp_project_id': os.getenv('FUGA_GCP_PROJECT_ID'),
-        'gcs_bucket_name': os.getenv('FUGA_GCS_BUCKET_NAME')}
+        import yaml
 
-    with open(_config_path, 'w') as f:
-        f.write(yaml.dump(_config, default_flow_style=False))
+        config_path = _get_config_path()
+        config = copy.deepcopy(DEFAULT_CONFIG)
+
+        if os.path.exists(config_path):
+            try:
+                with open(config_path) as f:
+                    config = yaml.safe_load(f) or {}
+            except ValueError:
+                config = {}
+        else:
+            config = {
+                'gcp_project_id': os.getenv('FUGA_GCP_PROJECT_ID'),
+                'gcs_bucket_name': os.getenv('FUGA_GCS_BUCKET_NAME')}
+
+            with open(config_path, 'w') as f:
+                f.write(yaml.dump(config, default_flow_style=False))
+
+        _config = config
+        return _config
 
 
 def validate_config():
-    if _config['gcp_project_id'] is None or \
-            _config['gcs_bucket_name'] is None:
+    config = _load_config()
+    if config.get('gcp_project_id') is None or \
+            config.get('gcs_bucket_name') is None:
         import sys
+        import click
         click.echo('''
 Missing required GCP/GCS configurations.
 
@@ -57,13 +81,17 @@ def get_config(name):
     env_name = 'FUGA_' + name.upper()
     # Prioritize env var over ~/.fuga/config.yml file
     # (It allows users to use multiple configurations)
-    return os.getenv(
-        env_name,
-        _config.get(name, None))
+    if env_name in os.environ:
+        return os.environ[env_name]
+
+    return _load_config().get(name, None)
 
 
 def write_config(key, value):
-    _config[key] = value
+    import yaml
+
+    config = _load_config()
+    config[key] = value
 
-    with open(_config_path, 'w') as f:
-        f.write(yaml.dump(_config, default_flow_style=False))
+    with open(_get_config_path(), 'w') as f:
+        f.write(yaml.dump(config, default_flow_style=False))
@@ -0,0 +1,775 @@
+"""Helpers for deploying experiment files to a Composer DAG bucket."""
+
+import base64
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from google.api_core.exceptions import NotFound
+
+from fuga.config import get_fuga_home
+
+
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+DEFAULT_CONCURRENCY = 8
+
+# Files larger than this are uploaded with resumable uploads
+DEFAULT_RESUMABLE_THRESHOLD = 16 * 1024 * 1024
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# Chunk sizes of resumable uploads must be multiples of 256 KiB
+CHUNK_SIZE_MULTIPLE = 256 * 1024
+
+_RESUME_INCOMPLETE = 308
+
+# Text files uploaded with `Content-Encoding: gzip` when gzip is enabled
+GZIP_EXTENSIONS = [
+    '.py', '.sql', '.txt', '.json', '.yml', '.yaml', '.md', '.cfg', '.ini',
+    '.csv', '.tsv', '.sh', '.html', '.j2', '.jinja2']
+
+# Custom metadata holding MD5 digest of uncompressed content of gzip encoded
+# blobs, since their `md5Hash` is the one of compressed content
+MD5_METADATA_KEY = 'fuga-md5'
+
+MANIFEST_NAME = '.fuga-manifest.json'
+
+BUNDLE_NAME = 'bundle.zip'
+BUNDLE_LOADER_NAME = 'fuga_bundle_loader.py'
+
+_BUNDLE_LOADER_TEMPLATE = '''\
+# Generated by `fuga experiment deploy --bundle`. Do not edit.
+# Loads airflow DAGs packed in {bundle_name} next to this file.
+import os
+
+from fuga.airflow import load_bundle
+
+load_bundle(
+    os.path.join(os.path.dirname(__file__), {bundle_name!r}),
+    globals())
+'''
+
+# Fixed timestamp for archive entries so that an archive of the same files
+# always has the same MD5 digest
+_BUNDLE_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+VERSIONS_DIR = '.versions'
+VERSION_LOADER_NAME = 'fuga_version_loader.py'
+
+_VERSION_LOADER_TEMPLATE = '''\
+# Generated by `fuga experiment deploy --versioned`. Do not edit.
+# Loads airflow DAGs of the version deployed under {versions_dir}/.
+import os
+
+from fuga.airflow import load_version
+
+VERSION = {version!r}
+
+load_version(os.path.dirname(__file__), VERSION, globals())
+'''
+
+# Keeps airflow scheduler from parsing DAG files of every deployed version
+_VERSIONS_AIRFLOWIGNORE = '/%s(/|$)\n' % re.escape(VERSIONS_DIR)
+
+# GCS JSON API accepts up to 100 calls in a single batch request
+_DELETE_BATCH_SIZE = 100
+_MANIFEST_VERSION = 1
+
+
+def local_md5(path):
+    """Compute MD5 digest of a local file.
+
+    Args:
+        path (string): Path to the local file.
+
+    Returns:
+        string: Base64-encoded MD5 digest, in the same format as
+        `google.cloud.storage.Blob.md5_hash`.
+
+    """
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+            md5.update(block)
+
+    return base64.b64encode(md5.digest()).decode('ascii')
+
+
+def list_remote_md5s(bucket, prefix):
+    """List MD5 digests of blobs under a prefix with a single listing.
+
+    Args:
+        bucket (google.cloud.storage.Bucket): Bucket to list.
+        prefix (string): Prefix of blob names to list.
+
+    Returns:
+        dict: Mapping from blob name to base64-encoded MD5 digest of its
+        uncompressed content. Blobs without MD5 digest (e.g. composite
+        objects) map to None.
+
+    """
+    blobs = bucket.list_blobs(
+        prefix=prefix,
+        fields='items(name,md5Hash,metadata),nextPageToken')
+
+    return {
+        blob.name: (blob.metadata or {}).get(
+            MD5_METADATA_KEY, blob.md5_hash)
+        for blob in blobs}
+
+
+def build_manifest(pairs, prefix, previous=None):
+    """Build a manifest describing local files to deploy.
+
+    Files whose size and mtime are identical to the ones recorded in
+    `previous` are assumed unchanged and are not hashed again.
+
+    Args:
+        pairs (list[tuple]): (local_path, remote_path) pairs to deploy.
+        prefix (string): Remote prefix the manifest is relative to.
+        previous (dict): Manifest of the previous deploy. Defaults to None.
+
+    Returns:
+        dict: Manifest mapping each relative path to its MD5 digest,
+        size and mtime.
+
+    """
+    previous_files = (previous or {}).get('files', {})
+    files = {}
+
+    for local_path, remote_path in pairs:
+        relative_path = os.path.relpath(remote_path, prefix)
+        stat = os.stat(local_path)
+        entry = previous_files.get(relative_path)
+
+        if entry is None \
+                or entry['size'] != stat.st_size \
+                or entry['mtime'] != stat.st_mtime:
+            entry = {
+                'md5': local_md5(local_path),
+                'size': stat.st_size,
+                'mtime': stat.st_mtime}
+        files[relative_path] = entry
+
+    return {'version': _MANIFEST_VERSION, 'files': files}
+
+
+def manifest_md5s(manifest, prefix):
+    """Get MD5 digests recorded in a manifest keyed by blob name.
+
+    Args:
+        manifest (dict): Manifest as returned by `build_manifest`.
+        prefix (string): Remote prefix the manifest is relative to.
+
+    Returns:
+        dict: Mapping from blob name to its base64-encoded MD5 digest.
+
+    """
+    return {
+        os.path.join(prefix, relative_path): entry['md5']
+        for relative_path, entry in manifest['files'].items()}
+
+
+def load_remote_manifest(bucket, prefix):
+    """Load the manifest written by the previous deploy with a single GET.
+
+    Args:
+        bucket (google.cloud.storage.Bucket): Bucket to read.
+        prefix (string): Remote prefix the manifest is stored under.
+
+    Returns:
+        dict: The manifest, or None if it does not exist or is unreadable.
+
+    """
+    blob = bucket.blob(os.path.join(prefix, MANIFEST_NAME))
+    try:
+        manifest = json.loads(blob.download_as_string().decode('utf-8'))
+    except (NotFound, ValueError):
+        return None
+
+    if manifest.get('version') != _MANIFEST_VERSION:
+        return None
+
+    return manifest
+
+
+def save_remote_manifest(bucket, prefix, manifest):
+    """Write a manifest under the given prefix.
+
+    Args:
+        bucket (google.cloud.storage.Bucket): Bucket to write.
+        prefix (string): Remote prefix to store the manifest under.
+        manifest (dict): Manifest as returned by `build_manifest`.
+
+    """
+    blob = bucket.blob(os.path.join(prefix, MANIFEST_NAME))
+    blob.upload_from_string(
+        json.dumps(manifest, sort_keys=True),
+        content_type='application/json')
+
+
+def plan_uploads(pairs, local_md5s, remote_md5s):
+    """Split (local_path, remote_path) pairs into changed and unchanged ones.
+
+    Args:
+        pairs (list[tuple]): (local_path, remote_path) pairs to deploy.
+        local_md5s (dict): Mapping from blob name to MD5 digest of the
+        local file to deploy there.
+        remote_md5s (dict): Mapping from blob name to MD5 digest of the
+        remote blob, as returned by `list_remote_md5s` or `manifest_md5s`.
+
+    Returns:
+        tuple: (pairs to upload, pairs to skip, total bytes skipped)
+
+    """
+    uploads = []
+    skips = []
+    skipped_bytes = 0
+
+    for local_path, remote_path in pairs:
+        remote_md5 = remote_md5s.get(remote_path)
+        if remote_md5 is not None and remote_md5 == local_md5s[remote_path]:
+            skips.append((local_path, remote_path))
+            skipped_bytes += os.path.getsize(local_path)
+        else:
+            uploads.append((local_path, remote_path))
+
+    return uploads, skips, skipped_bytes
+
+
+class UploadSessionStore:
+    """Persistent store of resumable upload session URIs.
+
+    Sessions are keyed by destination and local file stat, so that a session
+    is resumed only for the same version of the file.
+
+    Args:
+        path (string): Path to the JSON file to store sessions in.
+        Defaults to `upload_sessions.json` under `FUGA_HOME`.
+
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(
+            get_fuga_home(), 'upload_sessions.json')
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(bucket, local_path, remote_path):
+        stat = os.stat(local_path)
+        return 'gs://{}/{}:{}:{}'.format(
+            bucket.name, remote_path, stat.st_size, stat.st_mtime_ns)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _save(self, sessions):
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(sessions, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key):
+        with self._lock:
+            return self._load().get(key)
+
+    def set(self, key, session_uri):
+        with self._lock:
+            sessions = self._load()
+            sessions[key] = session_uri
+            self._save(sessions)
+
+    def delete(self, key):
+        with self._lock:
+            sessions = self._load()
+            if sessions.pop(key, None) is not None:
+                self._save(sessions)
+
+
+def _uploaded_offset(response):
+    # e.g. `Range: bytes=0-1048575` means first 1 MiB has been persisted
+    if 'Range' not in response.headers:
+        return 0
+    return int(response.headers['Range'].split('-')[-1]) + 1
+
+
+def _resumable_upload(blob, local_path, chunk_size, sessions, key):
+    size = os.path.getsize(local_path)
+    transport = blob.bucket.client._http
+    session_uri = sessions.get(key)
+    offset = 0
+
+    if session_uri is not None:
+        # Ask how many bytes the interrupted session has persisted
+        response = transport.put(
+            session_uri,
+            headers={'Content-Range': 'bytes */{}'.format(size)})
+        if response.status_code in (200, 201):
+            sessions.delete(key)
+            return size
+        elif response.status_code == _RESUME_INCOMPLETE:
+            offset = _uploaded_offset(response)
+        else:
+            # Expired or unknown session
+            session_uri = None
+
+    if session_uri is None:
+        session_uri = blob.create_resumable_upload_session(
+            content_type=blob.content_type, size=size)
+        sessions.set(key, session_uri)
+
+    with open(local_path, 'rb') as f:
+        while True:
+            f.seek(offset)
+            chunk = f.read(chunk_size)
+            response = transport.put(
+                session_uri,
+                data=chunk,
+                headers={
+                    'Content-Range': 'bytes {}-{}/{}'.format(
+                        offset, offset + len(chunk) - 1, size)})
+
+            if response.status_code in (200, 201):
+                sessions.delete(key)
+                return size
+            elif response.status_code == _RESUME_INCOMPLETE:
+                offset = _uploaded_offset(response)
+            else:
+                # Keep the session so that the next run resumes from here
+                raise Exception(
+                    'Resumable upload of %s failed with status %d: %s' % (
+                        local_path, response.status_code, response.text))
+
+
+def _upload(blob, path, resumable_threshold, chunk_size, sessions, key):
+    size = os.path.getsize(path)
+
+    if size <= resumable_threshold:
+        blob.upload_from_filename(path, content_type=blob.content_type)
+        return size
+
+    if sessions is None:
+        blob.chunk_size = chunk_size
+        blob.upload_from_filename(path, content_type=blob.content_type)
+        return size
+
+    return _resumable_upload(blob, path, chunk_size, sessions, key)
+
+
+def is_gzip_target(path):
+    return os.path.splitext(path)[1].lower() in GZIP_EXTENSIONS
+
+
+def upload_file(
+        bucket,
+        local_path,
+        remote_path,
+        resumable_threshold=DEFAULT_RESUMABLE_THRESHOLD,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        sessions=None,
+        gzip_text=False):
+    """Upload a single local file to a blob.
+
+    Files larger than `resumable_threshold` are uploaded in chunks with a
+    resumable upload. When `sessions` is given, session URIs are persisted
+    there so that an interrupted upload is resumed by the next call instead
+    of starting over.
+
+    With `gzip_text`, text files are compressed and uploaded with
+    `Content-Encoding: gzip` so that GCS serves them decompressed through
+    decompressive transcoding. MD5 digest of the uncompressed content is
+    kept in custom metadata for change detection.
+
+    Args:
+        bucket (google.cloud.storage.Bucket): Destination bucket.
+        local_path (string): Path to the local file.
+        remote_path (string): Name of the destination blob.
+        resumable_threshold (int): Size in bytes above which resumable
+        uploads are used.
+        chunk_size (int): Size in bytes of each chunk of resumable uploads.
+        Must be a multiple of 256 KiB.
+        sessions (UploadSessionStore): Store to persist session URIs in.
+        Defaults to None.
+        gzip_text (bool): Whether to upload text files gzip encoded.
+        Defaults to False.
+
+    Returns:
+        int: Number of bytes uploaded.
+
+    """
+    blob = bucket.blob(remote_path)
+    key = UploadSessionStore.key(bucket, local_path, remote_path)
+
+    if not gzip_text or not is_gzip_target(local_path):
+        return _upload(
+            blob, local_path, resumable_threshold, chunk_size, sessions, key)
+
+    blob.content_type = \
+        mimetypes.guess_type(local_path)[0] or 'text/plain'
+    blob.content_encoding = 'gzip'
+    blob.metadata = {MD5_METADATA_KEY: local_md5(local_path)}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        gzip_path = os.path.join(tmp_dir, os.path.basename(local_path))
+        with open(local_path, 'rb') as src, \
+                open(gzip_path, 'wb') as raw_dst, \
+                gzip.GzipFile(
+                    filename='', fileobj=raw_dst, mode='wb', mtime=0) as dst:
+            # Fixed mtime makes the output identical for the same input,
+            # which lets interrupted sessions be resumed
+            shutil.copyfileobj(src, dst)
+
+        return _upload(
+            blob,
+            gzip_path,
+            resumable_threshold,
+            chunk_size,
+            sessions,
+            key + ':gzip')
+
+
+def upload_files(bucket, pairs, concurrency=DEFAULT_CONCURRENCY,
+                 on_complete=None, **upload_options):
+    """Upload files concurrently with a bounded thread pool.
+
+    Failures of individual files do not stop other uploads. They are
+    collected and returned instead.
+
+    Args:
+        bucket (google.cloud.storage.Bucket): Destination bucket.
+        pairs (list[tuple]): (local_path, remote_path) pairs to upload.
+        concurrency (int): Maximum number of uploads in flight.
+        on_complete (callable): Called with (local_path, remote_path, error)
+        each time an upload finishes. `error` is None on success.
+        upload_options: Passed to `upload_file`.
+
+    Returns:
+        tuple: (list of uploaded pairs, total bytes uploaded,
+        list of (pair, exception) for failed uploads)
+
+    """
+    return _run_concurrently(
+        lambda local_path, remote_path: upload_file(
+            bucket, local_path, remote_path, **upload_options),
+        pairs,
+        concurrency,
+        on_complete)
+
+
+def copy_blobs(bucket, pairs, concurrency=DEFAULT_CONCURRENCY,
+               on_complete=None):
+    """Copy blobs within a bucket concurrently.
+
+    Copies are done on the server side, so that no data is transferred.
+
+    Args:
+        bucket (google.cloud.storage.Bucket): Bucket to copy blobs in.
+        pairs (list[tuple]): (source_name, destination_name) pairs to copy.
+        concurrency (int): Maximum number of copies in flight.
+        on_complete (callable): Called with (source_name, destination_name,
+        error) each time a copy finishes. `error` is None on success.
+
+    Returns:
+        tuple: (list of copied pairs, 0, list of (pair, exception) for
+        failed copies)
+
+    """
+    def copy(source_name, destination_name):
+        bucket.copy_blob(bucket.blob(source_name), bucket, destination_name)
+        return 0
+
+    return _run_concurrently(copy, pairs, concurrency, on_complete)
+
+
+def _run_concurrently(func, pairs, concurrency, on_complete):
+    done = []
+    total_bytes = 0
+    errors = []
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {executor.submit(func, *pair): pair for pair in pairs}
+
+        for future in as_completed(futures):
+            pair = futures[future]
+            try:
+                total_bytes += future.result()
+            except Exception as e:
+                errors.append((pair, e))
+                error = e
+            else:
+                done.append(pair)
+                error = None
+
+            if on_complete is not None:
+                on_complete(pair[0], pair[1], error)
+
+    return done, total_bytes, errors
+
+
+def delete_blobs(storage_client, bucket, names):
+    """Delete blobs with batched requests.
+
+    Blobs already missing are ignored. A batch only raises the first error
+    of its deletions, so blobs of a failed batch are deleted one by one to
+    find out which of them failed.
+
+    Args:
+        storage_client (google.cloud.storage.Client): Client to send
+        batch requests with.
+        bucket (google.cloud.storage.Bucket): Bucket to delete blobs from.
+        names (list[string]): Names of blobs to delete.
+
+    Returns:
+        tuple(list[string], list[tuple]): Names of blobs deleted or
+        already missing, and (name, exception) pairs of blobs failed to
+        delete.
+
+    """
+    deleted = []
+    errors = []
+
+    for i in range(0, len(names), _DELETE_BATCH_SIZE):
+        chunk = names[i:i + _DELETE_BATCH_SIZE]
+        try:
+            with storage_client.batch():
+                for name in chunk:
+                    bucket.delete_blob(name)
+        except Exception:
+            pass
+        else:
+            deleted.extend(chunk)
+            continue
+
+        for name in chunk:
+            try:
+                bucket.delete_blob(name)
+            except NotFound:
+                # Deleted by the batch already, or missing in the first place
+                deleted.append(name)
+            except Exception as e:
+                errors.append((name, e))
+            else:
+                deleted.append(name)
+
+    return deleted, errors
+
+
+def build_bundle(pairs, prefix, path):
+    """Pack files to deploy into a single zip archive.
+
+    Args:
+        pairs (list[tuple]): (local_path, remote_path) pairs to deploy.
+        prefix (string): Remote prefix archive entries are relative to.
+        path (string): Path to write the archive to.
+
+    """
+    entries = sorted(
+        (os.path.relpath(remote_path, prefix), local_path)
+        for local_path, remote_path in pairs)
+
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        for arcname, local_path in entries:
+            info = zipfile.ZipInfo(arcname, date_time=_BUNDLE_DATE_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            # Size lets large files be written with ZIP64 extensions
+            info.file_size = os.path.getsize(local_path)
+            # Streamed so that large files are never held in memory
+            with open(local_path, 'rb') as src, \
+                    bundle.open(info, 'w') as dst:
+                shutil.copyfileobj(src, dst)
+
+
+def write_bundle_loader(path):
+    """Write a DAG file which loads DAGs from the bundle next to it.
+
+    Args:
+        path (string): Path to write the loader to.
+
+    """
+    with open(path, 'w') as f:
+        f.write(_BUNDLE_LOADER_TEMPLATE.format(bundle_name=BUNDLE_NAME))
+
+
+def _watch_with_watchdog(directories, changes):
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if event.is_directory:
+                return
+            changes.put(event.src_path)
+            if getattr(event, 'dest_path', None):
+                changes.put(event.dest_path)
+
+    observer = Observer()
+    observer.daemon = True
+    for directory in directories:
+        observer.schedule(Handler(), directory, recursive=True)
+    observer.start()
+
+
+def _snapshot(directories):
+    snapshot = {}
+    for directory in directories:
+        for cur_dir, _dirs, files in os.walk(directory):
+            for filename in files:
+                path = os.path.join(cur_dir, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+
+    return snapshot
+
+
+def _watch_with_polling(directories, changes, interval):
+    def poll():
+        previous = _snapshot(directories)
+        while True:
+            time.sleep(interval)
+            current = _snapshot(directories)
+            for path in set(previous) | set(current):
+                if previous.get(path) != current.get(path):
+                    changes.put(path)
+            previous = current
+
+    threading.Thread(target=poll, daemon=True).start()
+
+
+def iter_changes(directories, debounce=0.3, poll_interval=1.0):
+    """Watch directories and yield paths of changed files.
+
+    Uses inotify (or other native APIs) through `watchdog` when it is
+    installed, and falls back to polling file stats otherwise. Bursts of
+    changes are debounced into a single set of paths.
+
+    Args:
+        directories (list[string]): Directories to watch recursively.
+        debounce (float): Seconds to wait for further changes before
+        yielding. Defaults to 0.3.
+        poll_interval (float): Seconds between polls when polling.
+        Defaults to 1.0.
+
+    Yields:
+        set[string]: Paths of files created, modified or deleted.
+
+    """
+    changes = queue.Queue()
+
+    try:
+        _watch_with_watchdog(directories, changes)
+    except ImportError:
+        _watch_with_polling(directories, changes, poll_interval)
+
+    while True:
+        changed_paths = {changes.get()}
+        while True:
+            try:
+                changed_paths.add(changes.get(timeout=debounce))
+            except queue.Empty:
+                break
+
+        yield changed_paths
+
+
+def version_id(manifest):
+    """Compute a content-addressed version id of a manifest.
+
+    Args:
+        manifest (dict): Manifest as returned by `build_manifest`.
+
+    Returns:
+        string: Version id, which is the same for the same set of files.
+
+    """
+    sha1 = hashlib.sha1()
+    for relative_path, entry in sorted(manifest['files'].items()):
+        sha1.update(
+            '{}:{}\n'.format(relative_path, entry['md5']).encode('utf-8'))
+
+    return sha1.hexdigest()[:12]
+
+
+def version_prefix(prefix, version):
+    return os.path.join(prefix, VERSIONS_DIR, version)
+
+
+def list_versions(bucket, prefix):
+    """List versions deployed under a prefix.
+
+    Args:
+        bucket (google.cloud.storage.Bucket): Bucket to list.
+        prefix (string): Remote prefix of the experiment.
+
+    Returns:
+        list[string]: Version ids.
+
+    """
+    iterator = bucket.list_blobs(
+        prefix=os.path.join(prefix, VERSIONS_DIR) + '/',
+        delimiter='/',
+        fields='prefixes,nextPageToken')
+    # Prefixes are collected while pages are consumed
+    for _page in iterator.pages:
+        pass
+
+    return sorted(p.rstrip('/').split('/')[-1] for p in iterator.prefixes)
+
+
+def read_current_version(bucket, prefix):
+    """Read the version the loader DAG file currently points to.
+
+    Args:
+        bucket (google.cloud.storage.Bucket): Bucket to read.
+        prefix (string): Remote prefix of the experiment.
+
+    Returns:
+        string: Version id, or None if no version has been deployed.
+
+    """
+    blob = bucket.blob(os.path.join(prefix, VERSION_LOADER_NAME))
+    try:
+        loader = blob.download_as_string().decode('utf-8')
+    except NotFound:
+        return None
+
+    m = re.search(r"^VERSION = '([0-9a-f]+)'$", loader, re.MULTILINE)
+
+    return m.group(1) if m else None
+
+
+def switch_version(bucket, prefix, version):
+    """Point the loader DAG file to a version.
+
+    Rewriting a single object is atomic on GCS, so that airflow scheduler
+    sees either the previous or the new version and nothing in between.
+
+    Args:
+        bucket (google.cloud.storage.Bucket): Bucket to write.
+        prefix (string): Remote prefix of the experiment.
+        version (string): Version id to switch to.
+
+    """
+    bucket.blob(os.path.join(prefix, '.airflowignore')).upload_from_string(
+        _VERSIONS_AIRFLOWIGNORE, content_type='text/plain')
+    bucket.blob(os.path.join(prefix, VERSION_LOADER_NAME)).upload_from_string(
+        _VERSION_LOADER_TEMPLATE.format(
+            versions_dir=VERSIONS_DIR,
+            version=version),
+        content_type='text/x-python')
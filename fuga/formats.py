@@ -0,0 +1,19 @@
+"""Formats of files exchanged between DAG definitions and tasks.
+
+Kept free of heavy dependencies, since it's imported when DAG files are
+parsed.
+"""
+
+# Formats of tables exported from BigQuery
+EXPORT_FORMATS = {
+    'csv': {
+        'extension': '.csv.gzip',
+        'export_format': 'CSV',
+        'compression': 'GZIP'},
+    'parquet': {
+        'extension': '.parquet',
+        'export_format': 'PARQUET',
+        'compression': 'SNAPPY'}}
+
+# Name of the sidecar object holding the BigQuery schema of an export
+EXPORT_SCHEMA_NAME = 'schema.json'
@@ -1,59 +1,1060 @@
 import io
+import os
+import re
+import gzip
+import json
+import mmap
+import zlib
+import asyncio
+import collections
+import hashlib
+import functools
+import tempfile
+import threading
+import contextlib
+import datetime as dt
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
 
+from google.api_core.exceptions import NotFound
 from google.cloud import storage
 import pandas as pd
-from fuga.config import get_config
+from fuga.config import get_config, get_fuga_home
+from fuga.formats import EXPORT_FORMATS, EXPORT_SCHEMA_NAME
+from fuga.http import configure_connection_pool
 
 
-def save_df(df, name):
+# Number of rows rendered at once by streaming `save_df`
+DEFAULT_SAVE_CHUNKSIZE = 100000
+
+# Size of each chunk sent to streaming uploads. Must be a multiple of 256 KiB
+_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# pandas dtypes of BigQuery types. Nullable integers keep NULLs without
+# falling back to float64.
+_BQ_DTYPES = {
+    'INTEGER': 'Int64',
+    'INT64': 'Int64',
+    'FLOAT': 'float64',
+    'FLOAT64': 'float64',
+    'BOOLEAN': 'boolean',
+    'BOOL': 'boolean',
+    'STRING': 'object',
+    'BYTES': 'object',
+    'TIME': 'object'}
+
+_BQ_DATE_TYPES = ['DATE', 'DATETIME', 'TIMESTAMP']
+
+# NUMERIC and BIGNUMERIC hold more digits than float64 does, so they are
+# loaded as `decimal.Decimal` objects, same as from Parquet exports
+_BQ_DECIMAL_TYPES = ['NUMERIC', 'BIGNUMERIC']
+
+# Maximum ratio of unique values to rows of string columns converted into
+# categoricals by downcasting
+DEFAULT_CATEGORY_RATIO = 0.5
+
+# Size of read buffer for range requests on blobs
+_READ_BUFFER_SIZE = 4 * 1024 * 1024
+
+DEFAULT_CACHE_MAX_BYTES = 10 * 1024 * 1024 * 1024
+
+# Number of users of each cache entry in the process, which eviction skips
+# so that entries are not removed before they're opened
+_cache_in_use = collections.Counter()
+_cache_lock = threading.Lock()
+
+DEFAULT_CONNECTION_POOL_SIZE = 10
+
+# Process-wide registry of clients and buckets, keyed by project and
+# (project, bucket name). Reset in forked processes.
+_clients = {}
+_buckets = {}
+_registry_lock = threading.Lock()
+_registry_pid = None
+
+
+class _CSVChunkStream(io.RawIOBase):
+    """Readable stream rendering a DataFrame into CSV chunk by chunk.
+
+    Only a chunk of rows (and its serialized form) is held in memory at a
+    time, which lets uploads consume a DataFrame of any size.
+
+    Resumable uploads track the position with `tell()`, and rewind to resend
+    a chunk on recovery. The last `rewind_size` bytes read are kept so that
+    the stream can be rewound that far.
+    """
+
+    def __init__(
+            self,
+            df,
+            chunksize,
+            compression=None,
+            rewind_size=_UPLOAD_CHUNK_SIZE):
+        self._df = df
+        self._chunksize = chunksize
+        self._offset = 0
+        self._buffer = bytearray()
+        self._history = bytearray()
+        self._rewind_size = rewind_size
+        self._position = 0
+        self._header_written = False
+        self._eof = False
+        # wbits=31 writes gzip header and trailer
+        self._compressor = zlib.compressobj(wbits=31) \
+            if compression == 'gzip' else None
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation(
+                'Can only seek from start or current position')
+
+        if offset > self._position \
+                or offset < self._position - len(self._history):
+            raise io.UnsupportedOperation(
+                'Can not seek to %d from %d' % (offset, self._position))
+
+        back = self._position - offset
+        if back > 0:
+            self._buffer[:0] = self._history[-back:]
+            del self._history[-back:]
+            self._position = offset
+
+        return self._position
+
+    def _fill(self):
+        # Header is written even if there are no rows, so that the output
+        # can be read back as an empty frame
+        if self._offset >= len(self._df) and self._header_written:
+            if self._compressor is not None:
+                self._buffer += self._compressor.flush()
+            self._eof = True
+            return
+
+        chunk = self._df.iloc[self._offset:self._offset + self._chunksize]
+        data = chunk.to_csv(header=not self._header_written).encode('utf-8')
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        self._buffer += data
+        self._offset += self._chunksize
+        self._header_written = True
+
+    def readinto(self, b):
+        while len(self._buffer) < len(b) and not self._eof:
+            self._fill()
+
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._history += self._buffer[:n]
+        if len(self._history) > self._rewind_size:
+            del self._history[:len(self._history) - self._rewind_size]
+        del self._buffer[:n]
+        self._position += n
+        return n
+
+
+def _write_parquet(df, path, chunksize, compression=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Infer schema from the whole frame so that every row group agrees
+    schema = pa.Schema.from_pandas(df, preserve_index=True)
+    with pq.ParquetWriter(
+            path, schema, compression=compression or 'snappy') as writer:
+        for offset in range(0, len(df), chunksize):
+            writer.write_table(pa.Table.from_pandas(
+                df.iloc[offset:offset + chunksize],
+                schema=schema,
+                preserve_index=True))
+
+
+def _output_key(name, date, format, compression):
+    if format == 'csv':
+        if compression not in (None, 'gzip'):
+            raise ValueError(
+                'Unsupported compression for csv format: %s' % compression)
+        ext = '.csv.gzip' if compression == 'gzip' else '.csv'
+    elif format == 'parquet':
+        ext = '.parquet'
+    else:
+        raise ValueError('Unsupported format: %s' % format)
+
+    return '{experiment_name}/output/{date_descriptor}/{name}{ext}' \
+        .format(
+            experiment_name=get_config('experiment_name'),
+            date_descriptor=date or '{{ ds_nodash }}',
+            name=name,
+            ext=ext)
+
+
+def save_df(
+        df,
+        name,
+        chunksize=DEFAULT_SAVE_CHUNKSIZE,
+        compression=None,
+        format='csv',
+        date=None):
     """Save dataframe to GCS.
 
+    DataFrames larger than `chunksize` rows are rendered chunk by chunk and
+    streamed into a resumable upload, so that memory usage is bounded by
+    the chunk size instead of the output size.
+
     Args:
         df (pandas.DataFrame): Dataframe to save.
+        name (string): Name of the output.
+        chunksize (int): Number of rows rendered at once. With parquet
+        format, it's the number of rows of each row group.
+        compression (string): 'gzip' to compress CSV output on the fly.
+        Other values raise ValueError with CSV format. Compression codec
+        for parquet format (defaults to 'snappy'). Defaults to None.
+        format (string): 'csv' or 'parquet'. Defaults to 'csv'.
+        date (string): Date of the output in `YYYYMMDD`. Defaults to
+        `{{ ds_nodash }}`.
 
     Returns:
         key (string): Key of dataframe blob saved to GCS.
 
     """
-    bucket = storage.Client(get_config('gcp_project_name')) \
-        .get_bucket(get_config('bucket_name'))
-    key = '{experiment_name}/output/{date_descriptor}/{name}.csv' \
-        .format(
-            experiment_name=get_config('experiment_name'),
-            date_descriptor='{{ ds_nodash }}',
-            name=name)
+    bucket = get_bucket()
+    key = _output_key(name, date, format, compression)
 
     blob = bucket.blob(key)
 
-    bio = io.BytesIO()
-    df.to_csv(bio)
-    blob.upload_from_file(bio, rewind=True)
+    if format == 'parquet':
+        # Row groups are written to a local file since parquet footer can
+        # only be written at the end
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, os.path.basename(key))
+            _write_parquet(df, path, chunksize, compression=compression)
+            if os.path.getsize(path) > _UPLOAD_CHUNK_SIZE:
+                blob.chunk_size = _UPLOAD_CHUNK_SIZE
+            blob.upload_from_filename(path)
+        return key
+
+    stream = _CSVChunkStream(df, chunksize, compression=compression)
+
+    if len(df) <= chunksize:
+        bio = io.BytesIO(stream.read())
+        blob.upload_from_file(bio, rewind=True)
+    else:
+        # Upload size is unknown until the whole frame is rendered
+        blob.chunk_size = _UPLOAD_CHUNK_SIZE
+        blob.upload_from_file(stream)
+
     return key
 
 
-def get_exported_table_df(table_name, date=None):
-    """Retrieve exported table file on GCS.
+async def save_df_async(df, name, *args, **kwargs):
+    """Save dataframe to GCS without blocking the event loop.
+
+    The upload runs in the default executor of the running loop, so that
+    several outputs can be saved concurrently with `asyncio.gather`.
+    See `save_df` for arguments.
+
+    Returns:
+        key (string): Key of dataframe blob saved to GCS.
+
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(save_df, df, name, *args, **kwargs))
+
+
+def load_df(
+        name,
+        compression=None,
+        format='csv',
+        date=None,
+        bucket_name=None):
+    """Load dataframe saved to GCS with `save_df`.
 
     Args:
-        table_name (string): Name of the table to load.
+        name (string): Name of the output.
+        compression (string): Compression the output was saved with.
+        Defaults to None.
+        format (string): 'csv' or 'parquet'. Defaults to 'csv'.
+        date (string): Date of the output in `YYYYMMDD`. Defaults to
+        `{{ ds_nodash }}`.
+        bucket_name (string): Bucket the output was saved to. Defaults to
+        `bucket_name` config.
 
     Returns:
         pandas.DataFrame
 
     """
+    blob = get_bucket(bucket_name).blob(
+        _output_key(name, date, format, compression))
+
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+
+        with io.BufferedReader(_BlobReader(blob), _READ_BUFFER_SIZE) as f:
+            return pq.read_table(f).to_pandas()
+
+    bio = io.BytesIO()
+    blob.download_to_file(bio)
+    bio.seek(0)
+
+    # Index is saved as the first column
+    try:
+        return pd.read_csv(bio, compression=compression, index_col=0)
+    except pd.errors.EmptyDataError:
+        # Saved without even a header row
+        return pd.DataFrame()
+
+
+class _BlobReader(io.RawIOBase):
+    """Seekable read-only stream over a blob using range requests.
+
+    Lets readers such as pyarrow fetch only the parts of a blob they need
+    (e.g. parquet footer and selected column chunks).
+    """
+
+    def __init__(self, blob):
+        self._blob = blob
+        if blob.size is None:
+            blob.reload()
+        self._size = blob.size
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        elif whence == io.SEEK_END:
+            self._position = self._size + offset
+        return self._position
+
+    def readinto(self, b):
+        if self._position >= self._size or len(b) == 0:
+            return 0
+
+        end = min(self._position + len(b), self._size) - 1
+        data = self._blob.download_as_string(start=self._position, end=end)
+        b[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+class ExportCache:
+    """Size-bounded LRU cache of exported table files on local disk.
+
+    Entries are keyed by bucket, blob name and generation, so that a blob
+    overwritten on GCS never hits a stale entry. Blobs are validated with
+    metadata obtained by listing exports, and downloaded only on a miss.
+
+    Args:
+        path (string): Directory to store entries in. Defaults to
+        `export_cache_dir` config, or `cache/exported_tables` under
+        `FUGA_HOME`.
+        max_bytes (int): Total size of entries above which least recently
+        used ones are evicted. Defaults to `export_cache_max_bytes` config,
+        or 10GiB.
+
+    """
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = path \
+            or get_config('export_cache_dir') \
+            or os.path.join(get_fuga_home(), 'cache', 'exported_tables')
+        self.max_bytes = int(
+            max_bytes
+            or get_config('export_cache_max_bytes')
+            or DEFAULT_CACHE_MAX_BYTES)
+
+        if not os.path.exists(self.path):
+            os.makedirs(self.path, exist_ok=True)
+
+    def _entry_path(self, blob):
+        key = '{}/{}#{}'.format(blob.bucket.name, blob.name, blob.generation)
+        return os.path.join(
+            self.path,
+            hashlib.sha1(key.encode('utf-8')).hexdigest()
+            + os.path.splitext(blob.name)[1])
+
+    @contextlib.contextmanager
+    def use(self, blob):
+        """Yield path to a local copy of a blob, downloading it on a miss.
+
+        The entry is never evicted until the context exits, so that it can
+        be opened safely while other threads fill the cache.
+
+        Args:
+            blob (google.cloud.storage.Blob): Blob with its generation
+            loaded.
+
+        Yields:
+            string: Path to the local copy.
+
+        """
+        if blob.generation is None:
+            blob.reload()
+
+        path = self._entry_path(blob)
+        with _cache_lock:
+            _cache_in_use[path] += 1
+        try:
+            self._fill(blob, path)
+            yield path
+        finally:
+            with _cache_lock:
+                _cache_in_use[path] -= 1
+                if _cache_in_use[path] == 0:
+                    del _cache_in_use[path]
+
+    def get_path(self, blob):
+        """Get path to a local copy of a blob, downloading it on a miss.
+
+        The entry may be evicted by other threads once returned. Use `use`
+        to keep it until it's opened.
+
+        Args:
+            blob (google.cloud.storage.Blob): Blob with its generation
+            loaded.
+
+        Returns:
+            string: Path to the local copy.
+
+        """
+        with self.use(blob) as path:
+            return path
+
+    def _fill(self, blob, path):
+        try:
+            # Mtime tracks recency of use for eviction
+            os.utime(path)
+            return
+        except FileNotFoundError:
+            pass
+
+        tmp_path = '{}.{}.{}.tmp'.format(
+            path, os.getpid(), threading.get_ident())
+        try:
+            blob.download_to_filename(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self.evict()
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the cache fits its size.
+
+        Entries in use in the process are never removed.
+
+        Args:
+            keep (string): Path to another entry never to be removed.
+
+        """
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.tmp') or not entry.is_file():
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_bytes = sum(size for _mtime, size, _path in entries)
+        for _mtime, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            with _cache_lock:
+                if path == keep or path in _cache_in_use:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total_bytes -= size
+
+
+def _resolve_cache(cache):
+    if cache is True:
+        return ExportCache()
+
+    return cache or None
+
+
+def _open_blob(blob, cache=None):
+    if cache is not None:
+        # Opened files are readable even if the entry is evicted later
+        with cache.use(blob) as path:
+            return open(path, 'rb')
+
+    return io.BufferedReader(_BlobReader(blob), _READ_BUFFER_SIZE)
+
+
+@contextlib.contextmanager
+def _local_copy(blob, cache=None):
+    """Yield path to a local copy of a blob.
+
+    The copy is downloaded to a temporary file removed afterwards, unless
+    it's taken from the cache.
+    """
+    if cache is not None:
+        with cache.use(blob) as path:
+            yield path
+        return
+
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(blob.name)[1])
+    os.close(fd)
+    try:
+        blob.download_to_filename(path)
+        yield path
+    finally:
+        os.remove(path)
+
+
+def _read_df(
+        blob,
+        format,
+        columns=None,
+        filters=None,
+        cache=None,
+        csv_options=None,
+        use_mmap=False):
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+
+        if use_mmap:
+            import pyarrow as pa
+
+            with _local_copy(blob, cache=cache) as path, \
+                    pa.memory_map(path) as source:
+                return pq.read_table(
+                    source, columns=columns, filters=filters).to_pandas()
+
+        with _open_blob(blob, cache=cache) as f:
+            return pq.read_table(f, columns=columns, filters=filters) \
+                .to_pandas()
+
+    if filters is not None:
+        raise ValueError('filters are only supported with parquet format')
+
+    csv_options = csv_options or {}
+
+    if use_mmap:
+        # Compressed data is paged in from disk by the OS as it's
+        # decompressed, instead of being held in Python heap
+        with _local_copy(blob, cache=cache) as path, \
+                open(path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                gzip.GzipFile(fileobj=mm) as gz:
+            return pd.read_csv(gz, usecols=columns, **csv_options)
+
+    if cache is not None:
+        with _open_blob(blob, cache=cache) as f:
+            return pd.read_csv(
+                f, compression='gzip', usecols=columns, **csv_options)
+
+    bio = io.BytesIO()
+    blob.download_to_file(bio)
+    bio.seek(0)
+
+    return pd.read_csv(
+        bio, compression='gzip', usecols=columns, **csv_options)
+
+
+def _csv_options(fields, columns=None):
+    """Build `pandas.read_csv` options from fields of a BigQuery schema."""
+    dtype = {}
+    parse_dates = []
+    converters = {}
+    for field in fields:
+        name = field['name']
+        if columns is not None and name not in columns:
+            continue
+
+        field_type = field['type'].upper()
+        if field_type in _BQ_DATE_TYPES:
+            parse_dates.append(name)
+        elif field_type in _BQ_DECIMAL_TYPES:
+            converters[name] = _to_decimal
+        elif field_type in _BQ_DTYPES:
+            dtype[name] = _BQ_DTYPES[field_type]
+
+    return {
+        'dtype': dtype,
+        'parse_dates': parse_dates,
+        'converters': converters}
 
-    bucket = storage \
-        .Client(get_config('gcp_project_name')) \
-        .get_bucket(get_config('bucket_name'))
-    key = \
+
+def _to_decimal(value):
+    # NULLs are exported as empty strings
+    return Decimal(value) if value != '' else None
+
+
+def _is_string_series(series):
+    # Object columns may hold other values than strings, e.g. decimals
+    return pd.api.types.infer_dtype(series, skipna=True) == 'string'
+
+
+def downcast_df(df, category_ratio=DEFAULT_CATEGORY_RATIO):
+    """Reduce memory usage of a DataFrame.
+
+    Numeric columns are converted into the smallest dtypes holding their
+    values, and string columns with few unique values into categoricals.
+    Note that floats are downcast to float32, which loses precision.
+
+    Args:
+        df (pandas.DataFrame): DataFrame to downcast. Modified in place.
+        category_ratio (float): Maximum ratio of unique values to rows of
+        string columns converted into categoricals. Defaults to 0.5.
+
+    Returns:
+        pandas.DataFrame
+
+    """
+    for name in df.columns:
+        series = df[name]
+        if pd.api.types.is_bool_dtype(series.dtype):
+            continue
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            df[name] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series.dtype):
+            df[name] = pd.to_numeric(series, downcast='float')
+        elif len(series) > 0 \
+                and _is_string_series(series) \
+                and series.nunique() <= category_ratio * len(series):
+            df[name] = series.astype('category')
+
+    return df
+
+
+def get_client(project=None):
+    """Get a storage client shared within the process.
+
+    Clients keep their HTTP connections alive in a pool of
+    `gcs_connection_pool_size` connections (defaults to 10). They are
+    re-created in forked processes, since connections must not be shared
+    across processes.
+
+    Args:
+        project (string): GCP project of the client. Defaults to
+        `gcp_project_name` config.
+
+    Returns:
+        google.cloud.storage.Client
+
+    """
+    global _registry_pid
+
+    project = project or get_config('gcp_project_name')
+
+    with _registry_lock:
+        if _registry_pid != os.getpid():
+            _clients.clear()
+            _buckets.clear()
+            _registry_pid = os.getpid()
+
+        client = _clients.get(project)
+        if client is None:
+            client = storage.Client(project)
+            pool_size = int(
+                get_config('gcs_connection_pool_size')
+                or DEFAULT_CONNECTION_POOL_SIZE)
+            configure_connection_pool(client, pool_size)
+            _clients[project] = client
+
+    return client
+
+
+def get_bucket(bucket_name=None):
+    """Get a bucket handle shared within the process.
+
+    Unlike `google.cloud.storage.Client.get_bucket`, no request is made to
+    get the bucket metadata.
+
+    Args:
+        bucket_name (string): Name of the bucket. Defaults to `bucket_name`
+        config.
+
+    Returns:
+        google.cloud.storage.Bucket
+
+    """
+    bucket_name = bucket_name or get_config('bucket_name')
+    client = get_client()
+
+    with _registry_lock:
+        bucket = _buckets.get((client.project, bucket_name))
+        if bucket is None:
+            bucket = client.bucket(bucket_name)
+            _buckets[(client.project, bucket_name)] = bucket
+
+    return bucket
+
+
+def _export_prefix(table_name, date):
+    return \
         '{experiment_name}/exported_tables/{table_name}/' \
-        '{date_descriptor}/out.csv.gzip'.format(
+        '{date_descriptor}/'.format(
             experiment_name=get_config('experiment_name'),
             table_name=table_name,
             date_descriptor=date or '{{ ds_nodash }}')
-    blob = storage.Blob(key, bucket)
-    bio = io.BytesIO()
-    blob.download_to_file(bio)
-    bio.seek(0)
 
-    return pd.read_csv(bio, compression='gzip')
+
+def _list_export_blobs(bucket, table_name, date, format):
+    """List files of an export, which may be sharded into `out-*` files."""
+    if format not in EXPORT_FORMATS:
+        raise ValueError('Unsupported format: %s' % format)
+
+    prefix = _export_prefix(table_name, date)
+    pattern = re.compile(
+        r'out(-\d+)?%s$' % re.escape(EXPORT_FORMATS[format]['extension']))
+    blobs = sorted(
+        (blob for blob in bucket.list_blobs(prefix=prefix + 'out')
+         if pattern.match(blob.name[len(prefix):])),
+        key=lambda blob: blob.name)
+
+    if len(blobs) == 0:
+        raise NotFound(
+            'No exported %s files found under gs://%s/%s'
+            % (format, bucket.name, prefix))
+
+    return blobs
+
+
+def save_export_schema(fields, destination_uri):
+    """Save BigQuery schema of an export next to its files.
+
+    Args:
+        fields (list[dict]): Fields of the schema of the exported table, as
+        returned by BigQuery API.
+        destination_uri (string): Destination URI of the export, e.g.
+        `gs://bucket/prefix/out-*.csv.gzip`.
+
+    Returns:
+        key (string): Key of the schema blob saved to GCS.
+
+    """
+    m = re.match(r'gs://([^/]+)/(.*)$', destination_uri)
+    if m is None:
+        raise ValueError('Invalid GCS URI: %s' % destination_uri)
+
+    bucket_name, path = m.groups()
+    key = path.rsplit('/', 1)[0] + '/' + EXPORT_SCHEMA_NAME
+    get_bucket(bucket_name).blob(key).upload_from_string(
+        json.dumps({'fields': fields}), content_type='application/json')
+
+    return key
+
+
+def _load_export_schema(bucket, table_name, date):
+    """Load fields of the schema saved next to an export, if any."""
+    blob = bucket.blob(_export_prefix(table_name, date) + EXPORT_SCHEMA_NAME)
+    try:
+        return json.loads(blob.download_as_string().decode('utf-8'))['fields']
+    except NotFound:
+        return None
+
+
+def _resolve_csv_options(bucket, table_name, date, format, schema, columns):
+    if format != 'csv' or schema is False:
+        return None
+
+    fields = _load_export_schema(bucket, table_name, date) \
+        if schema is True else schema
+    if fields is None:
+        return None
+
+    return _csv_options(fields, columns=columns)
+
+
+def _to_date(value):
+    if isinstance(value, str):
+        return dt.datetime.strptime(value, '%Y%m%d').date()
+    if isinstance(value, dt.datetime):
+        return value.date()
+
+    return value
+
+
+def _date_range(start, end):
+    """List dates from start to end inclusive in `YYYYMMDD`."""
+    start = _to_date(start)
+    end = _to_date(end)
+
+    return [
+        (start + dt.timedelta(days=i)).strftime('%Y%m%d')
+        for i in range((end - start).days + 1)]
+
+
+def _read_export_df(
+        bucket,
+        table_name,
+        date,
+        format,
+        columns,
+        filters,
+        max_workers,
+        cache,
+        schema,
+        use_mmap):
+    blobs = _list_export_blobs(bucket, table_name, date, format)
+    csv_options = _resolve_csv_options(
+        bucket, table_name, date, format, schema, columns)
+
+    if len(blobs) == 1:
+        return _read_df(
+            blobs[0], format, columns=columns, filters=filters, cache=cache,
+            csv_options=csv_options, use_mmap=use_mmap)
+
+    # Downloads and decompression release GIL, so threads are enough to
+    # read shards in parallel
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        dfs = list(executor.map(
+            lambda blob: _read_df(
+                blob, format, columns=columns, filters=filters,
+                cache=cache, csv_options=csv_options,
+                use_mmap=use_mmap),
+            blobs))
+
+    return pd.concat(dfs, ignore_index=True)
+
+
+def _read_export_range_df(
+        bucket, table_name, start, end, date_column, max_workers, **kwargs):
+    dates = _date_range(start, end)
+
+    def read(date):
+        try:
+            df = _read_export_df(
+                bucket, table_name, date, max_workers=max_workers, **kwargs)
+        except NotFound:
+            return None
+
+        if date_column in df.columns:
+            raise ValueError(
+                'Column %s already exists in exports of %s. '
+                'Pass another name as date_column.'
+                % (date_column, table_name))
+        df[date_column] = pd.Timestamp(dt.datetime.strptime(date, '%Y%m%d'))
+        return df
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        dfs = [df for df in executor.map(read, dates) if df is not None]
+
+    if len(dfs) == 0:
+        raise NotFound(
+            'No exports of %s found from %s to %s'
+            % (table_name, start, end))
+
+    return pd.concat(dfs, ignore_index=True)
+
+
+def get_exported_table_df(
+        table_name,
+        date=None,
+        format='csv',
+        columns=None,
+        filters=None,
+        bucket_name=None,
+        max_workers=None,
+        cache=False,
+        schema=True,
+        downcast=False,
+        use_mmap=False,
+        start=None,
+        end=None,
+        date_column='date'):
+    """Retrieve exported table file on GCS.
+
+    Sharded exports (`out-*` files) are downloaded and decoded concurrently
+    and concatenated in the order of shards.
+
+    With `start` and `end`, daily exports in the range are read in parallel
+    and concatenated in the order of dates, with the date of each export
+    in `date_column`. Days without exports are skipped.
+
+    Args:
+        table_name (string): Name of the table to load.
+        date (string): Date of the export in `YYYYMMDD`. Defaults to
+        `{{ ds_nodash }}`.
+        format (string): Format the table was exported in. 'csv' or
+        'parquet'. Defaults to 'csv'.
+        columns (list[string]): Columns to load. With parquet format, only
+        these columns are downloaded and decoded. Defaults to all columns.
+        filters (list): Row group filters in the form accepted by
+        `pyarrow.parquet.read_table`. Only supported with parquet format.
+        bucket_name (string): Bucket the table was exported to. Defaults to
+        `bucket_name` config.
+        max_workers (int): Maximum number of shards (and days) read at
+        once. Defaults to the default of
+        `concurrent.futures.ThreadPoolExecutor`.
+        cache (bool or ExportCache): Whether to keep downloaded files in a
+        local disk cache, so that repeated reads of the same export cost
+        only a listing. Whole files are cached even if `columns` are
+        specified. Defaults to False.
+        schema (bool or list[dict]): Whether to type CSV columns by the
+        BigQuery schema saved next to the export by
+        `fuga.airflow.get_export_table_operator`. Integers are loaded as
+        nullable `Int64`, NUMERIC and BIGNUMERIC as `decimal.Decimal`
+        without losing precision, and dates are parsed. Fields of a schema
+        can also be passed directly. Types are inferred by pandas if no
+        schema is found. Defaults to True.
+        downcast (bool): Whether to reduce memory usage with `downcast_df`.
+        Opt-in since it's lossy: floats are downcast to float32, which
+        keeps only about 7 significant digits. Defaults to False.
+        use_mmap (bool): Whether to download files to local disk and read
+        them through memory maps, instead of buffering them in memory. Peak
+        memory usage is reduced for large exports. Files in the cache are
+        mapped directly. Defaults to False.
+        start (string or datetime.date): First date of exports to read, in
+        `YYYYMMDD` if a string. Can't be used with `date`.
+        end (string or datetime.date): Last date of exports to read,
+        inclusive.
+        date_column (string): Name of the column added to hold dates of
+        exports read with `start` and `end`. ValueError is raised if the
+        exports already have a column of the name. Defaults to 'date'.
+
+    Returns:
+        pandas.DataFrame
+
+    """
+    cache = _resolve_cache(cache)
+    bucket = get_bucket(bucket_name)
+    read_options = dict(
+        format=format,
+        columns=columns,
+        filters=filters,
+        cache=cache,
+        schema=schema,
+        use_mmap=use_mmap)
+
+    if start is not None or end is not None:
+        if start is None or end is None:
+            raise ValueError('Both start and end must be specified')
+        if date is not None:
+            raise ValueError('date can\'t be used with start and end')
+
+        df = _read_export_range_df(
+            bucket, table_name, start, end, date_column, max_workers,
+            **read_options)
+    else:
+        df = _read_export_df(
+            bucket, table_name, date, max_workers=max_workers,
+            **read_options)
+
+    # Downcast after concatenation, since shards may not agree on
+    # categories or value ranges
+    if downcast:
+        df = downcast_df(df)
+
+    return df
+
+
+def get_exported_tables_df(table_names, max_workers=None, **kwargs):
+    """Retrieve several exported tables on GCS concurrently.
+
+    Downloads and decoding of tables overlap, so that loading many tables
+    takes about as long as loading the largest one.
+
+    Args:
+        table_names (list[string]): Names of the tables to load.
+        max_workers (int): Maximum number of tables read at once. Defaults
+        to the default of `concurrent.futures.ThreadPoolExecutor`.
+        **kwargs: Arguments passed to `get_exported_table_df` for every
+        table.
+
+    Returns:
+        dict[string, pandas.DataFrame]: DataFrames keyed by table names.
+
+    """
+    table_names = list(table_names)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        dfs = list(executor.map(
+            lambda table_name: get_exported_table_df(table_name, **kwargs),
+            table_names))
+
+    return dict(zip(table_names, dfs))
+
+
+async def get_exported_table_df_async(table_name, **kwargs):
+    """Retrieve exported table file on GCS without blocking the event loop.
+
+    See `get_exported_table_df` for arguments.
+
+    Returns:
+        pandas.DataFrame
+
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        None,
+        functools.partial(get_exported_table_df, table_name, **kwargs))
+
+
+def iter_exported_table(
+        table_name,
+        chunksize=DEFAULT_SAVE_CHUNKSIZE,
+        date=None,
+        format='csv',
+        columns=None,
+        bucket_name=None,
+        cache=False,
+        schema=True):
+    """Iterate over an exported table on GCS chunk by chunk.
+
+    Blobs are streamed from GCS and decoded incrementally, so that the
+    whole table is never held in memory. Shards of sharded exports are
+    read one after another.
+
+    Args:
+        table_name (string): Name of the table to load.
+        chunksize (int): Number of rows of each chunk.
+        date (string): Date of the export in `YYYYMMDD`. Defaults to
+        `{{ ds_nodash }}`.
+        format (string): Format the table was exported in. 'csv' or
+        'parquet'. Defaults to 'csv'.
+        columns (list[string]): Columns to load. Defaults to all columns.
+        bucket_name (string): Bucket the table was exported to. Defaults to
+        `bucket_name` config.
+        cache (bool or ExportCache): Whether to read through a local disk
+        cache. See `get_exported_table_df`. Defaults to False.
+        schema (bool or list[dict]): Whether to type CSV columns by the
+        BigQuery schema of the export. See `get_exported_table_df`.
+        Defaults to True.
+
+    Yields:
+        pandas.DataFrame: Chunk of the table.
+
+    """
+    cache = _resolve_cache(cache)
+    bucket = get_bucket(bucket_name)
+    blobs = _list_export_blobs(bucket, table_name, date, format)
+    csv_options = _resolve_csv_options(
+        bucket, table_name, date, format, schema, columns) or {}
+
+    for blob in blobs:
+        with _open_blob(blob, cache=cache) as f:
+            if format == 'parquet':
+                import pyarrow.parquet as pq
+
+                for batch in pq.ParquetFile(f).iter_batches(
+                        batch_size=chunksize, columns=columns):
+                    yield batch.to_pandas()
+            else:
+                with gzip.GzipFile(fileobj=f) as gz:
+                    for chunk in pd.read_csv(
+                            gz, chunksize=chunksize, usecols=columns,
+                            **csv_options):
+                        yield chunk
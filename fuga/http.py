@@ -0,0 +1,22 @@
+"""HTTP connection settings of GCS clients.
+
+Shared by the deploy commands and `fuga.gcs`, and kept free of other
+dependencies of either.
+"""
+
+from requests.adapters import HTTPAdapter
+
+
+def configure_connection_pool(storage_client, size):
+    """Let the storage client keep up to `size` connections alive.
+
+    Default `requests` pool keeps only 10 connections per host and
+    discards the others, which defeats concurrent uploads and downloads.
+
+    Args:
+        storage_client (google.cloud.storage.Client): Client to configure.
+        size (int): Maximum number of connections to keep per host.
+
+    """
+    adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+    storage_client._http.mount('https://', adapter)
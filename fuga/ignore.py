@@ -0,0 +1,209 @@
+"""gitignore-style ignore rules for files deployed by fuga."""
+
+import os
+import re
+
+
+# Hidden files and directories (e.g. `.env`, `.git/`) are ignored by default
+# as they were never deployed before. Ignore files can re-include them with
+# `!` patterns.
+DEFAULT_PATTERNS = [
+    '.*',
+    'venv/',
+    '__pycache__/',
+    '*.py[co]']
+
+IGNORE_FILENAMES = ['.gitignore', '.fugaignore']
+
+# Appended to paths of directories so that directory-only patterns can be
+# told apart within a single regular expression
+_DIR_MARKER = '\x00'
+
+
+def _translate(pattern):
+    """Translate a gitignore pattern into a regular expression.
+
+    The expression matches paths relative to the ignore file, where paths
+    of directories end with `_DIR_MARKER`.
+    """
+    dir_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+    # Patterns with a slash at the beginning or middle are relative to the
+    # ignore file. Others may match at any level.
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+
+    regex = ''
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            regex += '(?:[^%s]*/)?' % _DIR_MARKER
+            i += 3
+            continue
+        elif pattern.startswith('**', i):
+            regex += '[^%s]*' % _DIR_MARKER
+            i += 2
+            continue
+        elif c == '*':
+            regex += '[^/%s]*' % _DIR_MARKER
+        elif c == '?':
+            regex += '[^/%s]' % _DIR_MARKER
+        elif c == '[' and pattern.find(']', i + 2) >= 0:
+            j = pattern.find(']', i + 2)
+            chars = pattern[i + 1:j]
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            regex += '[' + chars.replace('\\', '\\\\') + ']'
+            i = j
+        elif c == '\\' and i + 1 < n:
+            regex += re.escape(pattern[i + 1])
+            i += 1
+        else:
+            regex += re.escape(c)
+        i += 1
+
+    if not anchored:
+        regex = '(?:[^%s]*/)?' % _DIR_MARKER + regex
+
+    return regex + (_DIR_MARKER if dir_only else _DIR_MARKER + '?')
+
+
+class IgnoreMatcher:
+    """Matcher compiled from gitignore-style patterns.
+
+    All patterns are compiled into a single regular expression. Since later
+    patterns take precedence over earlier ones (e.g. to re-include files
+    with `!`), alternatives are ordered from the last pattern and the
+    first one matching decides.
+    """
+
+    def __init__(self, patterns):
+        alternatives = []
+        self._negated = {}
+
+        for i, pattern in enumerate(patterns):
+            pattern = pattern.rstrip('\n').rstrip(' ')
+            if not pattern or pattern.startswith('#'):
+                continue
+
+            negated = pattern.startswith('!')
+            if negated:
+                pattern = pattern[1:]
+
+            group = 'p%d' % i
+            self._negated[group] = negated
+            alternatives.append(
+                '(?P<%s>%s)' % (group, _translate(pattern)))
+
+        if alternatives:
+            self._regex = re.compile(
+                '(?:%s)' % '|'.join(reversed(alternatives)), re.DOTALL)
+        else:
+            self._regex = None
+
+    @classmethod
+    def from_directory(
+            cls,
+            path,
+            filenames=IGNORE_FILENAMES,
+            defaults=DEFAULT_PATTERNS):
+        """Create a matcher from ignore files in a directory.
+
+        Only ignore files directly under the directory are read. Patterns in
+        nested ignore files are not supported.
+
+        Args:
+            path (string): Directory the patterns are relative to.
+            filenames (list[string]): Names of ignore files to read, in order
+            of increasing precedence. Defaults to `.gitignore` and
+            `.fugaignore`.
+            defaults (list[string]): Patterns applied before ones in ignore
+            files.
+
+        Returns:
+            IgnoreMatcher
+
+        """
+        patterns = list(defaults)
+        for filename in filenames:
+            ignore_file = os.path.join(path, filename)
+            if os.path.isfile(ignore_file):
+                with open(ignore_file) as f:
+                    patterns.extend(f.readlines())
+
+        return cls(patterns)
+
+    def match(self, relative_path, is_dir=False):
+        """Test whether a path itself is matched by the patterns.
+
+        Args:
+            relative_path (string): Path relative to the ignore file.
+            is_dir (bool): Whether the path is a directory.
+
+        Returns:
+            bool
+
+        """
+        if self._regex is None:
+            return False
+
+        m = self._regex.fullmatch(
+            relative_path + _DIR_MARKER if is_dir else relative_path)
+
+        return m is not None and not self._negated[m.lastgroup]
+
+    def is_ignored(self, relative_path):
+        """Test whether a file or any of its ancestors is ignored.
+
+        Args:
+            relative_path (string): Path of a file relative to the ignore
+            file.
+
+        Returns:
+            bool
+
+        """
+        parts = relative_path.split(os.sep)
+        for i in range(1, len(parts)):
+            if self.match('/'.join(parts[:i]), is_dir=True):
+                return True
+
+        return self.match('/'.join(parts))
+
+    def walk(self, root, directory):
+        """Yield files under a directory which are not ignored.
+
+        Ignored directories are pruned and never visited.
+
+        Args:
+            root (string): Directory the patterns are relative to.
+            directory (string): Directory to walk.
+
+        Yields:
+            string: Path of each file not ignored.
+
+        """
+        stack = [directory]
+        while stack:
+            try:
+                entries = sorted(
+                    os.scandir(stack.pop()), key=lambda e: e.name)
+            except FileNotFoundError:
+                continue
+
+            subdirectories = []
+            for entry in entries:
+                relative_path = os.path.relpath(entry.path, root) \
+                    .replace(os.sep, '/')
+                is_dir = entry.is_dir()
+                if self.match(relative_path, is_dir=is_dir):
+                    continue
+
+                if is_dir:
+                    subdirectories.append(entry.path)
+                elif entry.is_file():
+                    yield entry.path
+
+            stack.extend(reversed(subdirectories))
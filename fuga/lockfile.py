@@ -0,0 +1,118 @@
+"""Lockfile recording artifacts deployed for an experiment.
+
+`fuga pod_operator deploy` records the digest of each pushed image, so that
+DAGs can pin images by digest instead of mutable tags. The lockfile is
+deployed along with DAG files and read when DAG files are parsed.
+"""
+
+import os
+import json
+
+
+LOCKFILE_NAME = 'fuga.lock.json'
+
+# Number of directories looked up above the starting one for lockfiles
+_MAX_DEPTH = 4
+
+# Lockfiles read in the process, keyed by path, with their mtimes
+_lockfiles = {}
+
+
+def read_lockfile(path):
+    """Read a lockfile.
+
+    Args:
+        path (string): Path to the lockfile.
+
+    Returns:
+        dict: Content of the lockfile. Empty if it doesn't exist.
+
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+
+    cached = _lockfiles.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(path) as f:
+        lock = json.load(f)
+    _lockfiles[path] = (mtime, lock)
+
+    return lock
+
+
+def find_lockfile(directory):
+    """Find the lockfile of the experiment a directory belongs to.
+
+    The directory and its ancestors are looked up, up to the experiment
+    root (the directory with `fuga.yml`).
+
+    Args:
+        directory (string): Directory to start looking up from.
+
+    Returns:
+        string: Path to the lockfile, or None if not found.
+
+    """
+    directory = os.path.abspath(directory)
+    for _ in range(_MAX_DEPTH + 1):
+        path = os.path.join(directory, LOCKFILE_NAME)
+        if os.path.isfile(path):
+            return path
+        if os.path.isfile(os.path.join(directory, 'fuga.yml')):
+            return None
+
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+    return None
+
+
+def get_image(lock, operator_name):
+    """Get an image recorded for a pod operator.
+
+    Args:
+        lock (dict): Content of a lockfile.
+        operator_name (string): Name of the pod operator.
+
+    Returns:
+        dict: `image` (repository), `tag` and `digest` of the image, or
+        None if not recorded.
+
+    """
+    return lock.get('pod_operators', {}).get(operator_name)
+
+
+def record_image(path, operator_name, image, tag, digest):
+    """Record an image pushed for a pod operator in a lockfile.
+
+    Args:
+        path (string): Path to the lockfile. Created if it doesn't exist.
+        operator_name (string): Name of the pod operator.
+        image (string): Repository of the image, e.g.
+        `gcr.io/my-project/my-experiment__my-operator`.
+        tag (string): Tag pushed.
+        digest (string): Digest of the pushed image, e.g. `sha256:...`.
+
+    """
+    try:
+        with open(path) as f:
+            lock = json.load(f)
+    except FileNotFoundError:
+        lock = {}
+
+    lock.setdefault('pod_operators', {})[operator_name] = {
+        'image': image,
+        'tag': tag,
+        'digest': digest}
+
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(lock, f, indent=2, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp_path, path)
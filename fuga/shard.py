@@ -0,0 +1,209 @@
+"""Utilities for shards of pod operators fanned out by
+`fuga.airflow.get_sharded_pod_operators`.
+
+Each shard runs in its own pod, and finds which part of the input it
+processes from environment variables set by the helper.
+"""
+
+import os
+
+from fuga.config import get_config
+
+
+SHARD_INDEX_ENV = 'SHARD_INDEX'
+SHARD_COUNT_ENV = 'SHARD_COUNT'
+SHARD_OUTPUT_NAME_ENV = 'SHARD_OUTPUT_NAME'
+SHARD_INPUT_PREFIX_ENV = 'SHARD_INPUT_PREFIX'
+
+
+def get_shard():
+    """Get the shard the current pod runs as.
+
+    Returns:
+        tuple(int, int): Index of the shard and number of shards.
+
+    """
+    if SHARD_INDEX_ENV not in os.environ or SHARD_COUNT_ENV not in os.environ:
+        raise Exception(
+            'Missing %s or %s envvar. '
+            'The pod may not be run as a shard.'
+            % (SHARD_INDEX_ENV, SHARD_COUNT_ENV))
+
+    return int(os.environ[SHARD_INDEX_ENV]), int(os.environ[SHARD_COUNT_ENV])
+
+
+def shard_range(total, shard_index=None, shard_count=None):
+    """Get the range of rows a shard processes.
+
+    Rows are split into contiguous ranges whose sizes differ by one at
+    most.
+
+    Args:
+        total (int): Total number of rows.
+        shard_index (int): Index of the shard. Defaults to the current one.
+        shard_count (int): Number of shards. Defaults to the current one.
+
+    Returns:
+        tuple(int, int): Start (inclusive) and stop (exclusive) of the range.
+
+    """
+    if shard_index is None or shard_count is None:
+        shard_index, shard_count = get_shard()
+
+    return (
+        total * shard_index // shard_count,
+        total * (shard_index + 1) // shard_count)
+
+
+def list_shard_blobs(
+        prefix=None,
+        shard_index=None,
+        shard_count=None,
+        bucket_name=None):
+    """List blobs under a prefix a shard processes.
+
+    Blobs are assigned to shards so that each shard gets about the same
+    number of bytes. Every shard computes the same assignment from the
+    listing.
+
+    Args:
+        prefix (string): Prefix to list, either `gs://bucket/prefix` or a
+        prefix in `bucket_name`. Defaults to the prefix the shards were
+        created with.
+        shard_index (int): Index of the shard. Defaults to the current one.
+        shard_count (int): Number of shards. Defaults to the current one.
+        bucket_name (string): Bucket to list. Defaults to `bucket_name`
+        config.
+
+    Returns:
+        list[google.cloud.storage.Blob]
+
+    """
+    from fuga.gcs import get_bucket
+
+    if shard_index is None or shard_count is None:
+        shard_index, shard_count = get_shard()
+
+    prefix = prefix or os.environ.get(SHARD_INPUT_PREFIX_ENV)
+    if not prefix:
+        raise Exception(
+            'Missing prefix. Pass it or set %s envvar.'
+            % SHARD_INPUT_PREFIX_ENV)
+    if prefix.startswith('gs://'):
+        bucket_name, _, prefix = prefix[len('gs://'):].partition('/')
+
+    blobs = [
+        blob for blob in get_bucket(bucket_name).list_blobs(prefix=prefix)
+        if not blob.name.endswith('/')]
+
+    # Largest blobs first to whichever shard has the fewest bytes so far
+    loads = [0] * shard_count
+    assigned = []
+    for blob in sorted(blobs, key=lambda b: (-(b.size or 0), b.name)):
+        i = loads.index(min(loads))
+        loads[i] += blob.size or 0
+        if i == shard_index:
+            assigned.append(blob)
+
+    return sorted(assigned, key=lambda b: b.name)
+
+
+def shard_output_name(name, shard_index):
+    """Get name of the output of a shard.
+
+    Args:
+        name (string): Name of the merged output.
+        shard_index (int): Index of the shard.
+
+    Returns:
+        string
+
+    """
+    return '{}-shard-{:05d}'.format(name, shard_index)
+
+
+def save_shard_df(df, name=None, **kwargs):
+    """Save dataframe processed by the current shard to GCS.
+
+    Outputs of all shards are merged by the gather task.
+
+    Args:
+        df (pandas.DataFrame): Dataframe to save.
+        name (string): Name of the merged output. Defaults to the name the
+        shards were created with.
+        **kwargs: Arguments passed to `fuga.gcs.save_df`. `compression` and
+        `format` must match those of the gather task.
+
+    Returns:
+        key (string): Key of dataframe blob saved to GCS.
+
+    """
+    from fuga.gcs import save_df
+
+    shard_index, _shard_count = get_shard()
+    name = name or os.environ[SHARD_OUTPUT_NAME_ENV]
+    kwargs.setdefault('date', get_config('execution_date'))
+
+    return save_df(df, shard_output_name(name, shard_index), **kwargs)
+
+
+def gather_shard_dfs(
+        name,
+        shard_count,
+        date,
+        compression=None,
+        format='csv',
+        chunksize=None):
+    """Merge outputs of shards into a single output.
+
+    Shards with empty outputs are skipped.
+
+    Args:
+        name (string): Name of the merged output.
+        shard_count (int): Number of shards.
+        date (string): Date of the outputs in `YYYYMMDD`.
+        compression (string): Compression outputs are saved with. See
+        `fuga.gcs.save_df`. Defaults to None.
+        format (string): Format outputs are saved in. See
+        `fuga.gcs.save_df`. Defaults to 'csv'.
+        chunksize (int): Number of rows of the merged output rendered at
+        once. Defaults to that of `fuga.gcs.save_df`.
+
+    Returns:
+        key (string): Key of the merged output saved to GCS.
+
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    import pandas as pd
+
+    from fuga.gcs import load_df, save_df
+
+    with ThreadPoolExecutor() as executor:
+        dfs = list(executor.map(
+            lambda i: load_df(
+                shard_output_name(name, i),
+                compression=compression,
+                format=format,
+                date=date),
+            range(shard_count)))
+
+    # Empty frames are left out of concatenation, where they could change
+    # dtypes of columns
+    non_empty_dfs = [df for df in dfs if len(df) > 0]
+    if len(non_empty_dfs) > 0:
+        df = pd.concat(non_empty_dfs, ignore_index=True)
+    else:
+        df = max(dfs, key=lambda df: len(df.columns))
+
+    save_options = {}
+    if chunksize is not None:
+        save_options['chunksize'] = chunksize
+
+    return save_df(
+        df,
+        name,
+        compression=compression,
+        format=format,
+        date=date,
+        **save_options)
@@ -17,6 +17,13 @@ requirements = [
     'pyyaml~=4.2b1',  # pyyaml<=4.2 has a severe vulnerability
     'docker~=4.0.2']
 
+extra_requirements = {
+    # Native file system events for `fuga experiment deploy --watch`
+    'watch': ['watchdog'],
+    # Parquet format of `fuga.gcs` (`ParquetFile.iter_batches` needs 3.0)
+    'parquet': ['pyarrow>=3.0'],
+}
+
 setup_requirements = []
 
 test_requirements = []
@@ -39,6 +46,7 @@ setup(
         ],
     },
     install_requires=requirements,
+    extras_require=extra_requirements,
     license="MIT license",
     long_description=readme,
     long_description_content_type="text/markdown",
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+"""In-memory fakes of GCS buckets for tests."""
+
+import os
+import base64
+import hashlib
+import unittest
+import contextlib
+from unittest import mock
+
+from google.api_core.exceptions import NotFound
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.metadata = None
+        self.content_encoding = None
+        self.content_type = None
+        self.chunk_size = None
+
+    @property
+    def _data(self):
+        if self.name not in self.bucket.objects:
+            raise NotFound(self.name)
+        return self.bucket.objects[self.name]
+
+    @property
+    def size(self):
+        data = self.bucket.objects.get(self.name)
+        return None if data is None else len(data)
+
+    @property
+    def md5_hash(self):
+        data = self.bucket.objects.get(self.name)
+        if data is None:
+            return None
+        return base64.b64encode(hashlib.md5(data).digest()).decode('utf-8')
+
+    @property
+    def generation(self):
+        return hash(self.bucket.objects.get(self.name)) & 0xffffffff
+
+    def reload(self):
+        self._data
+
+    def _put(self, data):
+        self.bucket.objects[self.name] = bytes(data)
+        self.bucket.object_metadata[self.name] = self.metadata
+
+    def upload_from_file(self, f, rewind=False, **kwargs):
+        if rewind:
+            f.seek(0)
+        if self.chunk_size is None:
+            self._put(f.read())
+            return
+
+        # Read in chunks as resumable uploads do
+        self.bucket.streamed.append(self.name)
+        self._put(b''.join(iter(lambda: f.read(self.chunk_size), b'')))
+
+    def upload_from_filename(self, path, **kwargs):
+        with open(path, 'rb') as f:
+            self._put(f.read())
+
+    def upload_from_string(self, data, content_type=None):
+        self._put(data.encode('utf-8') if isinstance(data, str) else data)
+
+    def download_as_string(self, start=None, end=None):
+        data = self._data
+        if start is not None:
+            data = data[start:None if end is None else end + 1]
+        return data
+
+    def download_to_file(self, f):
+        f.write(self._data)
+
+    def download_to_filename(self, path):
+        with open(path, 'wb') as f:
+            f.write(self._data)
+
+    def delete(self):
+        self._data
+        del self.bucket.objects[self.name]
+
+
+class FakeBucket:
+    def __init__(self, name='bucket'):
+        self.name = name
+        self.objects = {}
+        self.object_metadata = {}
+        # Names of blobs uploaded in chunks
+        self.streamed = []
+        # Errors raised on deleting blobs by name, in place of deleting them
+        self.delete_errors = {}
+        self._batch = None
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def get_blob(self, name):
+        if name not in self.objects:
+            return None
+        blob = FakeBlob(self, name)
+        blob.metadata = self.object_metadata.get(name)
+        return blob
+
+    def list_blobs(self, prefix='', fields=None):
+        return [
+            self.get_blob(name) for name in sorted(self.objects)
+            if name.startswith(prefix)]
+
+    def copy_blob(self, blob, destination_bucket, new_name):
+        destination_bucket.objects[new_name] = blob._data
+        return destination_bucket.blob(new_name)
+
+    def delete_blob(self, name):
+        if self._batch is not None:
+            self._batch.append(name)
+            return
+        if name in self.delete_errors:
+            raise self.delete_errors[name]
+        self.blob(name).delete()
+
+
+class FakeClient:
+    """Client whose batches, like those of GCS, raise only the first error
+    of their requests after sending all of them."""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.batches = []
+
+    @contextlib.contextmanager
+    def batch(self):
+        names = self.bucket._batch = []
+        try:
+            yield
+        finally:
+            self.bucket._batch = None
+        self.batches.append(names)
+
+        errors = []
+        for name in names:
+            try:
+                self.bucket.delete_blob(name)
+            except Exception as e:
+                errors.append(e)
+        if len(errors) > 0:
+            raise errors[0]
+
+
+class FakeBucketTestCase(unittest.TestCase):
+    """Base of tests running as an experiment whose bucket is faked.
+
+    `fuga.gcs.get_bucket` returns `self.bucket`, and envvars in `env` are
+    set in addition to the experiment name.
+    """
+
+    experiment_name = 'e'
+    env = {}
+
+    def setUp(self):
+        from fuga import gcs
+
+        self.bucket = FakeBucket()
+        env = dict(self.env, FUGA_EXPERIMENT_NAME=self.experiment_name)
+        patchers = [
+            mock.patch.object(gcs, 'get_bucket', lambda *a: self.bucket),
+            mock.patch.dict(os.environ, env)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
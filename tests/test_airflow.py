@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for operators of `fuga.airflow`."""
+
+
+import unittest
+import importlib.util
+from unittest import mock
+
+
+def _http_error(status):
+    from googleapiclient.errors import HttpError
+
+    return HttpError(mock.Mock(status=status), b'')
+
+
+@unittest.skipUnless(
+    importlib.util.find_spec('airflow') is not None
+    and importlib.util.find_spec('googleapiclient') is not None,
+    'airflow or google-api-python-client is not installed')
+class TestMaybeCreateEmptyDataset(unittest.TestCase):
+    """Tests for `BigQueryMaybeCreateEmptyDatasetOperator`."""
+
+    def setUp(self):
+        from fuga import airflow
+
+        self.airflow = airflow
+        self.service = mock.Mock()
+        self.datasets = self.service.datasets.return_value
+
+        patcher = mock.patch(
+            'airflow.contrib.hooks.bigquery_hook.BigQueryHook')
+        hook = patcher.start()
+        self.addCleanup(patcher.stop)
+        hook.return_value.get_service.return_value = self.service
+
+        patcher = mock.patch.object(airflow, '_existing_datasets', set())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _execute(self):
+        operator = self.airflow.BigQueryMaybeCreateEmptyDatasetOperator(
+            task_id='create_dataset',
+            dataset_id=['a', 'b'],
+            project_id='project')
+        operator.execute({})
+
+    def test_exists(self):
+        """Test that existing datasets are looked up once and not created."""
+        self._execute()
+        self._execute()
+
+        self.assertEqual(self.datasets.get.call_count, 2)
+        self.datasets.insert.assert_not_called()
+
+    def test_not_found(self):
+        """Test that datasets are created only when not found."""
+        self.datasets.get.return_value.execute.side_effect = [
+            _http_error(404), {}]
+
+        self._execute()
+
+        self.datasets.insert.assert_called_once_with(
+            projectId='project',
+            body={'datasetReference': {
+                'projectId': 'project', 'datasetId': 'a'}})
+
+    def test_created_concurrently(self):
+        """Test that datasets created by another task are tolerated."""
+        self.datasets.get.return_value.execute.side_effect = \
+            _http_error(404)
+        self.datasets.insert.return_value.execute.side_effect = \
+            _http_error(409)
+
+        self._execute()
+
+        self.assertEqual(self.datasets.insert.call_count, 2)
+
+    def test_error(self):
+        """Test that other errors of the lookup are raised."""
+        self.datasets.get.return_value.execute.side_effect = \
+            _http_error(403)
+
+        from googleapiclient.errors import HttpError
+
+        with self.assertRaises(HttpError):
+            self._execute()
+        self.datasets.insert.assert_not_called()
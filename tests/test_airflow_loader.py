@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for loading bundles and versions with `fuga.airflow`."""
+
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import importlib.util
+
+
+_DAG_FILE = '''
+import datetime
+
+from airflow.models import DAG
+
+import helpers
+
+dag = DAG(helpers.DAG_ID, start_date=datetime.datetime(2020, 1, 1))
+'''
+
+
+@unittest.skipUnless(
+    importlib.util.find_spec('airflow') is not None,
+    'airflow is not installed')
+class TestLoadVersion(unittest.TestCase):
+    """Tests for `fuga.airflow.load_version`."""
+
+    def setUp(self):
+        self.experiment_dir = tempfile.mkdtemp()
+        for version in ['v1', 'v2']:
+            py_dir = os.path.join(
+                self.experiment_dir, '.versions', version, 'py')
+            os.makedirs(py_dir)
+            with open(os.path.join(py_dir, 'dag.py'), 'w') as f:
+                f.write(_DAG_FILE)
+            with open(os.path.join(py_dir, 'helpers.py'), 'w') as f:
+                f.write('DAG_ID = %r\n' % version)
+
+        self.sys_path = list(sys.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.experiment_dir)
+        sys.path[:] = self.sys_path
+        sys.modules.pop('helpers', None)
+
+    def _load(self, version):
+        from fuga.airflow import load_version
+
+        namespace = {}
+        load_version(self.experiment_dir, version, namespace)
+        return namespace['_fuga_dag_dag'].dag_id
+
+    def test_load_versions(self):
+        """Test that each version imports its own modules."""
+        self.assertEqual(self._load('v1'), 'v1')
+        self.assertEqual(self._load('v2'), 'v2')
+        self.assertEqual(self._load('v1'), 'v1')
+
+        py_dirs = [p for p in sys.path if p.startswith(self.experiment_dir)]
+        self.assertEqual(py_dirs, [sys.path[0]])
+        self.assertEqual(
+            sys.path[0],
+            os.path.join(self.experiment_dir, '.versions', 'v1', 'py'))
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Parse-time benchmark for DAG files using `fuga.airflow`.
+
+Requires airflow, which is installed by `tox -e airflow`.
+"""
+
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import importlib.util
+import subprocess
+
+from fuga.lockfile import LOCKFILE_NAME, record_image
+
+
+# Seconds allowed for defining a DAG with fuga.airflow on top of defining
+# the same DAG with airflow operators directly. Kept well below the import
+# time of pandas so that importing it is caught. Slow machines may raise it
+# with the envvar.
+PARSE_TIME_BUDGET = float(os.environ.get('FUGA_PARSE_TIME_BUDGET', '0.1'))
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules which must not be imported while DAG files are parsed
+HEAVY_MODULES = ['pandas', 'google.cloud.storage', 'fuga.gcs']
+
+_DAG_FILE_TEMPLATE = '''
+import sys
+import json
+import time
+
+import airflow  # noqa: F401
+
+start = time.time()
+
+{definition}
+
+print(json.dumps({{
+    'elapsed': time.time() - start,
+    'modules': sorted(sys.modules)}}))
+'''
+
+_FUGA_DAG = '''
+from fuga.airflow import get_dag, get_maybe_create_dataset_operator, \\
+    get_export_table_operator, get_kubernetes_pod_operator
+
+with get_dag() as dag:
+    create_dataset = get_maybe_create_dataset_operator(dag=dag)
+    export_csv = get_export_table_operator('table_a', dag=dag)
+    export_parquet = get_export_table_operator(
+        'table_b', dag=dag, format='parquet')
+    train = get_kubernetes_pod_operator('train', dag=dag)
+    create_dataset >> [export_csv, export_parquet]
+    train.set_upstream([export_csv, export_parquet])
+'''
+
+# BigQueryOperator imports pandas by itself, so it's benchmarked apart
+# from the check of heavy modules
+_FUGA_BQ_TO_BQ_DAG = '''
+from fuga.airflow import get_dag, get_bq_to_bq_operator
+
+with get_dag() as dag:
+    get_bq_to_bq_operator('SELECT 1', 'table_c', dag=dag)
+'''
+
+# Same DAGs defined with airflow operators only, as the baseline
+_AIRFLOW_DAG = '''
+import datetime
+
+from airflow.models import DAG
+from airflow.contrib.operators.bigquery_operator import \\
+    BigQueryCreateEmptyDatasetOperator
+from airflow.contrib.operators.bigquery_to_gcs import \\
+    BigQueryToCloudStorageOperator
+from airflow.contrib.operators.kubernetes_pod_operator import \\
+    KubernetesPodOperator
+
+with DAG('parse_time', start_date=datetime.datetime(2020, 1, 1)) as dag:
+    create_dataset = BigQueryCreateEmptyDatasetOperator(
+        task_id='create_dataset', dataset_id='parse_time_database')
+    export_csv = BigQueryToCloudStorageOperator(
+        task_id='export_csv',
+        source_project_dataset_table='parse_time_database.table_a',
+        destination_cloud_storage_uris=['gs://bucket/out-*.csv.gzip'])
+    export_parquet = BigQueryToCloudStorageOperator(
+        task_id='export_parquet',
+        source_project_dataset_table='parse_time_database.table_b',
+        destination_cloud_storage_uris=['gs://bucket/out-*.parquet'])
+    train = KubernetesPodOperator(
+        task_id='train',
+        name='train',
+        namespace='default',
+        image='gcr.io/project/parse_time__train@sha256:0')
+    create_dataset >> [export_csv, export_parquet]
+    train.set_upstream([export_csv, export_parquet])
+'''
+
+_AIRFLOW_BQ_TO_BQ_DAG = '''
+import datetime
+
+from airflow.models import DAG
+from airflow.contrib.operators.bigquery_operator import BigQueryOperator
+
+with DAG('parse_time', start_date=datetime.datetime(2020, 1, 1)) as dag:
+    BigQueryOperator(
+        task_id='bq_to_bq',
+        sql='SELECT 1',
+        destination_dataset_table='parse_time_database.table_c',
+        use_legacy_sql=False)
+'''
+
+
+@unittest.skipUnless(
+    importlib.util.find_spec('airflow') is not None,
+    'airflow is not installed')
+class TestAirflowParseTime(unittest.TestCase):
+    """Parse-time benchmark for DAG files using `fuga.airflow`."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fuga_home = os.path.join(self.tmp_dir, '.fuga')
+        # Pin the pod operator image as deployed experiments do
+        self.dags_dir = os.path.join(self.tmp_dir, 'parse_time')
+        os.makedirs(os.path.join(self.dags_dir, 'py'))
+        record_image(
+            os.path.join(self.dags_dir, LOCKFILE_NAME),
+            'train',
+            'gcr.io/project/parse_time__train',
+            'LATEST',
+            'sha256:0')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _parse_dag_file(self, definition):
+        path = os.path.join(self.dags_dir, 'py', 'dag.py')
+        with open(path, 'w') as f:
+            f.write(_DAG_FILE_TEMPLATE.format(definition=definition))
+
+        env = dict(
+            os.environ,
+            PYTHONPATH=os.pathsep.join(
+                [_ROOT_DIR, os.environ.get('PYTHONPATH', '')]),
+            FUGA_HOME=self.fuga_home,
+            FUGA_EXPERIMENT_NAME='parse_time',
+            FUGA_GCP_PROJECT_NAME='project',
+            FUGA_BUCKET_NAME='bucket',
+            AIRFLOW_VAR_NOTIFICATION_EMAIL_ADDRESS='fuga@example.com')
+        # Run in a fresh interpreter so that modules imported by other
+        # tests don't count
+        output = subprocess.check_output([sys.executable, path], env=env)
+        return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+    def _overhead(self, fuga_definition, airflow_definition):
+        # Best of a few runs to reduce noise of the machine
+        return min(
+            self._parse_dag_file(fuga_definition)['elapsed']
+            - self._parse_dag_file(airflow_definition)['elapsed']
+            for _ in range(3))
+
+    def test_heavy_modules_not_imported(self):
+        """Test that DAG definition doesn't import execution-time modules."""
+        result = self._parse_dag_file(_FUGA_DAG)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, result['modules'])
+
+    def test_config_not_loaded(self):
+        """Test that config file is not touched with config in env vars."""
+        self._parse_dag_file(_FUGA_DAG)
+        self.assertFalse(os.path.exists(self.fuga_home))
+
+    def test_parse_time_budget(self):
+        """Test that fuga.airflow adds little to parse time of DAGs."""
+        self.assertLess(
+            self._overhead(_FUGA_DAG, _AIRFLOW_DAG), PARSE_TIME_BUDGET)
+
+    def test_bq_to_bq_parse_time_budget(self):
+        """Test that get_bq_to_bq_operator adds little to parse time."""
+        self.assertLess(
+            self._overhead(_FUGA_BQ_TO_BQ_DAG, _AIRFLOW_BQ_TO_BQ_DAG),
+            PARSE_TIME_BUDGET)
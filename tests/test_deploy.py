@@ -0,0 +1,524 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `fuga.deploy` module."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from google.api_core.exceptions import Forbidden, NotFound
+
+from fuga import deploy
+from fuga.cli.experiment import ExperimentDeployCommand
+from tests.fakes import FakeBucket, FakeClient
+
+
+class TestDeleteBlobs(unittest.TestCase):
+    """Tests for `fuga.deploy.delete_blobs`."""
+
+    def setUp(self):
+        self.bucket = FakeBucket()
+        self.client = FakeClient(self.bucket)
+        for i in range(5):
+            self.bucket.objects['dags/%d.py' % i] = b''
+
+    def test_delete(self):
+        """Test that blobs are deleted in batches."""
+        names = sorted(self.bucket.objects)
+        with mock.patch.object(deploy, '_DELETE_BATCH_SIZE', 2):
+            deleted, errors = deploy.delete_blobs(
+                self.client, self.bucket, names)
+
+        self.assertEqual(deleted, names)
+        self.assertEqual(errors, [])
+        self.assertEqual(self.bucket.objects, {})
+        self.assertEqual(len(self.client.batches), 3)
+
+    def test_missing(self):
+        """Test that missing blobs are ignored."""
+        names = ['dags/0.py', 'dags/missing.py', 'dags/1.py']
+        deleted, errors = deploy.delete_blobs(
+            self.client, self.bucket, names)
+
+        self.assertEqual(deleted, names)
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            sorted(self.bucket.objects),
+            ['dags/2.py', 'dags/3.py', 'dags/4.py'])
+
+    def test_errors(self):
+        """Test that blobs failed to delete are reported but not deleted."""
+        error = Forbidden('dags/1.py')
+        self.bucket.delete_errors['dags/1.py'] = error
+        names = ['dags/missing.py', 'dags/0.py', 'dags/1.py', 'dags/2.py']
+        deleted, errors = deploy.delete_blobs(
+            self.client, self.bucket, names)
+
+        self.assertEqual(
+            deleted, ['dags/missing.py', 'dags/0.py', 'dags/2.py'])
+        self.assertEqual(errors, [('dags/1.py', error)])
+        self.assertEqual(
+            sorted(self.bucket.objects),
+            ['dags/1.py', 'dags/3.py', 'dags/4.py'])
+
+    def test_error_after_not_found(self):
+        """Test that errors are not hidden behind NotFound of a batch."""
+        self.bucket.delete_errors['dags/0.py'] = NotFound('dags/0.py')
+        self.bucket.delete_errors['dags/1.py'] = Forbidden('dags/1.py')
+        deleted, errors = deploy.delete_blobs(
+            self.client, self.bucket, ['dags/0.py', 'dags/1.py'])
+
+        self.assertEqual(deleted, ['dags/0.py'])
+        self.assertEqual([name for name, _e in errors], ['dags/1.py'])
+
+
+class _DeployTestCase(unittest.TestCase):
+    """Base of tests deploying files in a temporary directory to a fake
+    bucket."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.bucket = FakeBucket()
+        self.client = FakeClient(self.bucket)
+        self.command = ExperimentDeployCommand()
+        self.command._upload_options = {
+            'chunk_size': deploy.DEFAULT_CHUNK_SIZE,
+            'resumable_threshold': deploy.DEFAULT_RESUMABLE_THRESHOLD,
+            'sessions': None,
+            'gzip_text': False}
+
+        patcher = mock.patch('click.confirm')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path, 'dags/experiment/' + name
+
+    def _deploy(self, pairs, sync=False):
+        """Deploy pairs and return names of blobs uploaded."""
+        with mock.patch.object(
+                deploy, 'upload_file', wraps=deploy.upload_file) as upload:
+            with mock.patch('click.echo'):
+                self.command._deploy(
+                    self.client,
+                    self.bucket,
+                    'dags/experiment',
+                    pairs,
+                    sync=sync)
+        return sorted(call[0][2] for call in upload.call_args_list)
+
+
+class TestPlanUploads(_DeployTestCase):
+    """Tests for skipping files unchanged in the bucket."""
+
+    def test_plan_uploads(self):
+        """Test that only files with different digests are uploaded."""
+        pairs = [
+            self._write('py/dag.py', 'dag'),
+            self._write('sql/a.sql', 'a')]
+        local_md5s = {
+            remote_path: deploy.local_md5(local_path)
+            for local_path, remote_path in pairs}
+        remote_md5s = {
+            'dags/experiment/py/dag.py': local_md5s[
+                'dags/experiment/py/dag.py'],
+            'dags/experiment/sql/a.sql': 'changed'}
+
+        uploads, skips, skipped_bytes = deploy.plan_uploads(
+            pairs, local_md5s, remote_md5s)
+
+        self.assertEqual(uploads, [pairs[1]])
+        self.assertEqual(skips, [pairs[0]])
+        self.assertEqual(skipped_bytes, 3)
+
+        uploads, skips, _skipped_bytes = deploy.plan_uploads(
+            pairs, local_md5s, {})
+        self.assertEqual(uploads, pairs)
+
+    def test_skip_remote_unchanged(self):
+        """Test that files identical to remote blobs are not uploaded."""
+        pairs = [self._write('py/a.py', 'a'), self._write('py/b.py', 'b')]
+        self.bucket.objects['dags/experiment/py/a.py'] = b'a'
+
+        self.assertEqual(self._deploy(pairs), ['dags/experiment/py/b.py'])
+
+
+class TestManifest(_DeployTestCase):
+    """Tests for change detection with the deploy manifest."""
+
+    def setUp(self):
+        super().setUp()
+        self.pairs = [
+            self._write('py/dag.py', 'dag'),
+            self._write('sql/a.sql', 'a')]
+
+    def test_build_manifest(self):
+        """Test that digests are computed for every file."""
+        manifest = deploy.build_manifest(self.pairs, 'dags/experiment')
+
+        self.assertEqual(sorted(manifest['files']), ['py/dag.py', 'sql/a.sql'])
+        self.assertEqual(
+            manifest['files']['py/dag.py']['md5'],
+            deploy.local_md5(self.pairs[0][0]))
+        self.assertEqual(manifest['files']['py/dag.py']['size'], 3)
+
+    def test_build_manifest_quick_check(self):
+        """Test that files of the same size and mtime are not hashed."""
+        previous = deploy.build_manifest(self.pairs, 'dags/experiment')
+        previous['files']['py/dag.py']['md5'] = 'previous'
+
+        with mock.patch.object(
+                deploy, 'local_md5', wraps=deploy.local_md5) as local_md5:
+            manifest = deploy.build_manifest(
+                self.pairs, 'dags/experiment', previous=previous)
+        self.assertEqual(local_md5.call_count, 0)
+        self.assertEqual(manifest['files']['py/dag.py']['md5'], 'previous')
+
+        stat = os.stat(self.pairs[0][0])
+        os.utime(self.pairs[0][0], (stat.st_atime, stat.st_mtime + 1))
+        manifest = deploy.build_manifest(
+            self.pairs, 'dags/experiment', previous=previous)
+        self.assertEqual(
+            manifest['files']['py/dag.py']['md5'],
+            deploy.local_md5(self.pairs[0][0]))
+
+    def test_remote_manifest(self):
+        """Test that manifests are saved and loaded in a bucket."""
+        self.assertIsNone(deploy.load_remote_manifest(self.bucket, 'dags/e'))
+
+        manifest = deploy.build_manifest(self.pairs, 'dags/experiment')
+        deploy.save_remote_manifest(self.bucket, 'dags/e', manifest)
+        self.assertEqual(
+            deploy.load_remote_manifest(self.bucket, 'dags/e'), manifest)
+
+        self.bucket.objects['dags/e/' + deploy.MANIFEST_NAME] = \
+            b'{"version": 0}'
+        self.assertIsNone(deploy.load_remote_manifest(self.bucket, 'dags/e'))
+
+    def test_skip_unchanged(self):
+        """Test that files unchanged since the last deploy are skipped."""
+        self.assertEqual(self._deploy(self.pairs), [r for _l, r in self.pairs])
+        self.assertIn(
+            'dags/experiment/' + deploy.MANIFEST_NAME, self.bucket.objects)
+
+        self.pairs[1] = self._write('sql/a.sql', 'changed')
+        self.assertEqual(
+            self._deploy(self.pairs), ['dags/experiment/sql/a.sql'])
+        self.assertEqual(
+            self.bucket.objects['dags/experiment/sql/a.sql'], b'changed')
+
+        self.assertEqual(self._deploy(self.pairs), [])
+
+
+class TestBundle(_DeployTestCase):
+    """Tests for `fuga.deploy.build_bundle`."""
+
+    def test_build_bundle(self):
+        """Test that files are packed with paths relative to the prefix."""
+        pairs = [
+            self._write('py/dag.py', 'dag'),
+            self._write('pod_operators/model.bin', 'x' * 100000)]
+        path = os.path.join(self.tmp_dir, 'bundle.zip')
+
+        with mock.patch.object(zipfile.ZipFile, 'writestr') as writestr:
+            deploy.build_bundle(pairs, 'dags/experiment', path)
+        self.assertEqual(writestr.call_count, 0)
+
+        with zipfile.ZipFile(path) as bundle:
+            self.assertEqual(
+                bundle.namelist(), ['pod_operators/model.bin', 'py/dag.py'])
+            self.assertEqual(bundle.read('py/dag.py'), b'dag')
+            self.assertEqual(
+                bundle.read('pod_operators/model.bin'), b'x' * 100000)
+
+    def test_build_bundle_reproducible(self):
+        """Test that bundles of the same files are identical."""
+        pairs = [self._write('py/dag.py', 'dag')]
+        paths = [os.path.join(self.tmp_dir, name) for name in ['a', 'b']]
+        for path in paths:
+            deploy.build_bundle(pairs, 'dags/experiment', path)
+            os.utime(pairs[0][0], (0, 0))
+
+        self.assertEqual(
+            deploy.local_md5(paths[0]), deploy.local_md5(paths[1]))
+
+
+class TestSync(_DeployTestCase):
+    """Tests for deleting stale files with sync."""
+
+    def test_sync(self):
+        """Test that remote files removed locally are deleted with sync."""
+        pairs = [self._write('py/a.py', 'a'), self._write('py/b.py', 'b')]
+        self._deploy(pairs)
+
+        self._deploy(pairs[:1])
+        self.assertIn('dags/experiment/py/b.py', self.bucket.objects)
+
+        self._deploy(pairs[:1], sync=True)
+        self.assertEqual(sorted(self.bucket.objects), [
+            'dags/experiment/' + deploy.MANIFEST_NAME,
+            'dags/experiment/py/a.py'])
+
+    def test_sync_reuploads_changed_outside(self):
+        """Test that blobs changed or deleted outside fuga are uploaded
+        again with sync."""
+        pairs = [self._write('py/a.py', 'a'), self._write('py/b.py', 'b')]
+        self._deploy(pairs)
+        self.bucket.objects['dags/experiment/py/a.py'] = b'overwritten'
+        del self.bucket.objects['dags/experiment/py/b.py']
+
+        self.assertEqual(self._deploy(pairs), [])
+        self.assertEqual(
+            self._deploy(pairs, sync=True), [r for _l, r in pairs])
+        self.assertEqual(self.bucket.objects['dags/experiment/py/a.py'], b'a')
+
+
+class TestSwitchMode(_DeployTestCase):
+    """Tests for removing files of another deploy mode without sync."""
+
+    def _deploy_bundle(self, pairs):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with mock.patch('click.echo'):
+                bundle_pairs = self.command._bundle_pairs(
+                    pairs, 'dags/experiment', tmp_dir)
+            self._deploy(bundle_pairs)
+
+    def _deploy_version(self, pairs):
+        with mock.patch('click.echo'):
+            self.command._deploy_version(
+                self.client, self.bucket, 'dags/experiment', pairs)
+
+    def _names(self):
+        return sorted(
+            name[len('dags/experiment/'):]
+            for name in self.bucket.objects)
+
+    def test_plain_to_bundle(self):
+        """Test that plain files are deleted when switched to a bundle."""
+        pairs = [self._write('py/a.py', 'a')]
+        self._deploy(pairs)
+
+        self._deploy_bundle(pairs)
+
+        self.assertEqual(self._names(), sorted([
+            deploy.BUNDLE_LOADER_NAME,
+            deploy.BUNDLE_NAME,
+            deploy.MANIFEST_NAME]))
+
+    def test_bundle_to_plain(self):
+        """Test that a bundle is deleted when switched to plain files."""
+        pairs = [self._write('py/a.py', 'a')]
+        self._deploy_bundle(pairs)
+
+        self._deploy(pairs)
+
+        self.assertEqual(
+            self._names(), sorted([deploy.MANIFEST_NAME, 'py/a.py']))
+
+    def test_plain_to_versioned(self):
+        """Test that plain files are deleted when switched to versions."""
+        pairs = [self._write('py/a.py', 'a')]
+        self._deploy(pairs)
+
+        self._deploy_version(pairs)
+
+        self.assertIn(deploy.VERSION_LOADER_NAME, self._names())
+        self.assertEqual(
+            [n for n in self._names()
+             if not n.startswith(deploy.VERSIONS_DIR + '/')
+             and n not in (deploy.VERSION_LOADER_NAME, '.airflowignore')],
+            [])
+
+    def test_versioned_to_plain(self):
+        """Test that the loader of versions is deleted when switched to
+        plain files."""
+        pairs = [self._write('py/a.py', 'a')]
+        self._deploy_version(pairs)
+
+        self._deploy(pairs)
+
+        self.assertNotIn(deploy.VERSION_LOADER_NAME, self._names())
+        self.assertIn('py/a.py', self._names())
+        self.assertIsNone(
+            deploy.read_current_version(self.bucket, 'dags/experiment'))
+
+    def test_same_mode(self):
+        """Test that files outside a mode are kept without a switch."""
+        pairs = [self._write('py/a.py', 'a'), self._write('py/b.py', 'b')]
+        self._deploy_version(pairs)
+        self.bucket.objects['dags/experiment/py/other.py'] = b'other'
+
+        self._deploy_version(pairs[:1])
+
+        self.assertIn('py/other.py', self._names())
+
+    def test_upload_error(self):
+        """Test that files of the previous mode are kept until the new mode
+        is deployed."""
+        pairs = [self._write('py/a.py', 'a')]
+        self._deploy(pairs)
+
+        with mock.patch.object(
+                deploy, 'upload_file', side_effect=Exception('error')):
+            with self.assertRaises(SystemExit):
+                self._deploy_bundle(pairs)
+        self.assertIn('py/a.py', self._names())
+
+        self._deploy_bundle(pairs)
+        self.assertNotIn('py/a.py', self._names())
+
+
+class _Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = ''
+
+
+class _ResumableTransport:
+    """Transport of a resumable upload session persisting up to
+    `persist_limit` bytes per request."""
+
+    def __init__(self, persisted=0, persist_limit=None):
+        self.persisted = persisted
+        self.persist_limit = persist_limit
+        self.data = b''
+        self.requests = []
+
+    def _incomplete(self):
+        if self.persisted == 0:
+            return _Response(deploy._RESUME_INCOMPLETE)
+        return _Response(
+            deploy._RESUME_INCOMPLETE,
+            {'Range': 'bytes=0-%d' % (self.persisted - 1)})
+
+    def put(self, url, data=None, headers=None):
+        content_range = headers['Content-Range']
+        self.requests.append(content_range)
+        size = int(content_range.split('/')[-1])
+
+        if data is not None:
+            start = int(content_range.split(' ')[1].split('-')[0])
+            assert start == self.persisted, content_range
+            data = data[:self.persist_limit]
+            self.data += data
+            self.persisted += len(data)
+
+        if self.persisted == size:
+            return _Response(200)
+        return self._incomplete()
+
+
+class _SessionBlob:
+    def __init__(self, transport):
+        self.bucket = mock.Mock()
+        self.bucket.client._http = transport
+        self.content_type = None
+        self.sessions_created = 0
+
+    def create_resumable_upload_session(self, content_type=None, size=None):
+        self.sessions_created += 1
+        return 'https://example.com/session'
+
+
+class TestResumableUpload(unittest.TestCase):
+    """Tests for `fuga.deploy._resumable_upload`."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'data.bin')
+        self.content = bytes(range(256)) * 40
+        with open(self.path, 'wb') as f:
+            f.write(self.content)
+        self.sessions = deploy.UploadSessionStore(
+            os.path.join(self.tmp_dir, 'sessions.json'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_upload(self):
+        """Test that chunks are uploaded from the persisted offset."""
+        transport = _ResumableTransport(persist_limit=1000)
+        blob = _SessionBlob(transport)
+
+        size = deploy._resumable_upload(
+            blob, self.path, 4096, self.sessions, 'key')
+
+        self.assertEqual(size, len(self.content))
+        self.assertEqual(transport.data, self.content)
+        self.assertEqual(transport.requests[:2], [
+            'bytes 0-4095/10240',
+            'bytes 1000-5095/10240'])
+        self.assertIsNone(self.sessions.get('key'))
+
+    def test_resume(self):
+        """Test that an interrupted session is resumed where it stopped."""
+        transport = _ResumableTransport(persisted=6000)
+        transport.data = self.content[:6000]
+        blob = _SessionBlob(transport)
+        self.sessions.set('key', 'https://example.com/session')
+
+        deploy._resumable_upload(blob, self.path, 4096, self.sessions, 'key')
+
+        self.assertEqual(blob.sessions_created, 0)
+        self.assertEqual(transport.requests, [
+            'bytes */10240',
+            'bytes 6000-10095/10240',
+            'bytes 10096-10239/10240'])
+        self.assertEqual(transport.data, self.content)
+
+    def test_resume_completed(self):
+        """Test that nothing is sent again for a completed session."""
+        transport = _ResumableTransport(persisted=len(self.content))
+        self.sessions.set('key', 'https://example.com/session')
+
+        deploy._resumable_upload(
+            _SessionBlob(transport), self.path, 4096, self.sessions, 'key')
+
+        self.assertEqual(transport.requests, ['bytes */10240'])
+        self.assertIsNone(self.sessions.get('key'))
+
+    def test_failure(self):
+        """Test that the session is kept for the next run on failure."""
+        transport = _ResumableTransport()
+        transport.put = lambda *args, **kwargs: _Response(503)
+
+        with self.assertRaises(Exception):
+            deploy._resumable_upload(
+                _SessionBlob(transport), self.path, 4096, self.sessions,
+                'key')
+
+        self.assertEqual(
+            self.sessions.get('key'), 'https://example.com/session')
+
+
+class TestVersionId(_DeployTestCase):
+    """Tests for ids of versioned deploys."""
+
+    def test_version_id(self):
+        """Test that version ids depend only on paths and digests."""
+        pairs = [
+            self._write('py/dag.py', 'dag'),
+            self._write('sql/a.sql', 'a')]
+        manifest = deploy.build_manifest(pairs, 'dags/experiment')
+        same = {'files': {
+            relative_path: {'md5': entry['md5'], 'size': 0, 'mtime': 0}
+            for relative_path, entry in reversed(
+                list(manifest['files'].items()))}}
+        self.assertEqual(deploy.version_id(manifest), deploy.version_id(same))
+
+        same['files']['py/dag.py']['md5'] = 'changed'
+        self.assertNotEqual(
+            deploy.version_id(manifest), deploy.version_id(same))
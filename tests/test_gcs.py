@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `fuga.gcs` module."""
+
+
+import io
+import os
+import gzip
+import json
+import shutil
+import tempfile
+from decimal import Decimal
+import unittest
+from unittest import mock
+
+import pandas as pd
+from google.resumable_media._upload import get_next_chunk
+
+from fuga import gcs
+from tests.fakes import FakeBucket, FakeBucketTestCase
+
+
+def _read_chunks(stream, chunk_size):
+    """Read a stream like resumable uploads of unknown size do."""
+    payloads = []
+    while True:
+        start_byte, payload, _content_range = get_next_chunk(
+            stream, chunk_size, None)
+        assert start_byte == sum(len(p) for p in payloads)
+        payloads.append(payload)
+        if len(payload) < chunk_size:
+            return b''.join(payloads)
+
+
+class TestCSVChunkStream(unittest.TestCase):
+    """Tests for `fuga.gcs._CSVChunkStream`."""
+
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'a': range(20000),
+            'b': ['value-%d' % i for i in range(20000)]})
+
+    def test_chunk_reader(self):
+        """Test that chunks read with tell() cover the whole CSV."""
+        stream = gcs._CSVChunkStream(self.df, 1000, rewind_size=64 * 1024)
+
+        self.assertEqual(
+            _read_chunks(stream, 64 * 1024),
+            self.df.to_csv().encode('utf-8'))
+
+    def test_chunk_reader_gzip(self):
+        """Test that gzip compressed chunks decompress into the CSV."""
+        stream = gcs._CSVChunkStream(
+            self.df, 1000, compression='gzip', rewind_size=64 * 1024)
+
+        self.assertEqual(
+            gzip.decompress(_read_chunks(stream, 64 * 1024)),
+            self.df.to_csv().encode('utf-8'))
+
+    def test_rewind(self):
+        """Test that a chunk can be read again after seeking back to it."""
+        stream = gcs._CSVChunkStream(self.df, 1000, rewind_size=1024)
+        stream.read(1024)
+        first = stream.read(1024)
+
+        self.assertEqual(stream.seek(1024), 1024)
+        self.assertEqual(stream.read(1024), first)
+        self.assertEqual(stream.tell(), 2048)
+        with self.assertRaises(io.UnsupportedOperation):
+            stream.seek(0)
+
+    def test_empty_frame(self):
+        """Test that header is written for an empty frame."""
+        df = self.df.iloc[:0]
+        stream = gcs._CSVChunkStream(df, 1000)
+
+        read_df = pd.read_csv(io.BytesIO(stream.read()), index_col=0)
+        self.assertEqual(list(read_df.columns), ['a', 'b'])
+        self.assertEqual(len(read_df), 0)
+
+
+class TestSaveDf(FakeBucketTestCase):
+    """Tests for `fuga.gcs.save_df` and `fuga.gcs.load_df`."""
+
+    def test_gzip(self):
+        """Test that gzip compressed CSV is saved and loaded."""
+        df = pd.DataFrame({'v': [1, 2]})
+        key = gcs.save_df(df, 'out', compression='gzip', date='20200101')
+
+        self.assertEqual(key, 'e/output/20200101/out.csv.gzip')
+        pd.testing.assert_frame_equal(
+            gcs.load_df('out', compression='gzip', date='20200101'), df)
+
+    def test_unsupported_compression(self):
+        """Test that CSV compressions other than gzip are rejected."""
+        with self.assertRaises(ValueError):
+            gcs.save_df(pd.DataFrame({'v': [1]}), 'out', compression='bz2')
+        self.assertEqual(self.bucket.objects, {})
+
+    def test_parquet(self):
+        """Test that parquet is saved in row groups and loaded back."""
+        df = pd.DataFrame({'v': range(5), 'name': list('abcde')})
+        key = gcs.save_df(
+            df, 'out', chunksize=2, format='parquet', date='20200101')
+
+        self.assertEqual(key, 'e/output/20200101/out.parquet')
+        pd.testing.assert_frame_equal(
+            gcs.load_df('out', format='parquet', date='20200101'), df)
+
+
+class TestExportShards(FakeBucketTestCase):
+    """Tests for reading exports sharded into `out-*` files."""
+
+    prefix = 'e/exported_tables/t/20200101/'
+
+    def _export(self, name, df):
+        self.bucket.objects[self.prefix + name] = \
+            gzip.compress(df.to_csv(index=False).encode('utf-8'))
+
+    def test_list_export_blobs(self):
+        """Test that only files of the export are listed in order."""
+        for name in [
+                'out-000000000002.csv.gzip',
+                'out-000000000000.csv.gzip',
+                'out-000000000001.csv.gzip',
+                'out.parquet',
+                'out-x.csv.gzip',
+                'out-000000000000.csv.gzip.tmp',
+                'schema.json']:
+            self.bucket.objects[self.prefix + name] = b''
+        self.bucket.objects[
+            'e/exported_tables/t/20200102/out.csv.gzip'] = b''
+
+        blobs = gcs._list_export_blobs(self.bucket, 't', '20200101', 'csv')
+
+        self.assertEqual(
+            [blob.name[len(self.prefix):] for blob in blobs],
+            ['out-000000000000.csv.gzip',
+             'out-000000000001.csv.gzip',
+             'out-000000000002.csv.gzip'])
+
+    def test_list_single_file(self):
+        """Test that an unsharded export is listed."""
+        self.bucket.objects[self.prefix + 'out.csv.gzip'] = b''
+
+        blobs = gcs._list_export_blobs(self.bucket, 't', '20200101', 'csv')
+
+        self.assertEqual(
+            [blob.name for blob in blobs], [self.prefix + 'out.csv.gzip'])
+
+    def test_list_not_found(self):
+        """Test that an export without files of the format is not found."""
+        self.bucket.objects[self.prefix + 'schema.json'] = b''
+
+        with self.assertRaises(gcs.NotFound):
+            gcs._list_export_blobs(self.bucket, 't', '20200101', 'csv')
+
+    def test_concat_order(self):
+        """Test that shards are concatenated in the order of their names."""
+        for i in [2, 0, 1]:
+            self._export(
+                'out-%012d.csv.gzip' % i,
+                pd.DataFrame({'v': [2 * i, 2 * i + 1]}))
+
+        df = gcs.get_exported_table_df(
+            't', date='20200101', schema=False, max_workers=3)
+
+        self.assertEqual(df['v'].tolist(), list(range(6)))
+        self.assertEqual(df.index.tolist(), list(range(6)))
+
+
+class TestExportRange(FakeBucketTestCase):
+    """Tests for reading exports of a range of dates."""
+
+    def _export(self, table_name, date, df):
+        self.bucket.objects[
+            'e/exported_tables/%s/%s/out.csv.gzip' % (table_name, date)] = \
+            gzip.compress(df.to_csv(index=False).encode('utf-8'))
+
+    def test_range(self):
+        """Test that exports are concatenated with their dates."""
+        self._export('t', '20200101', pd.DataFrame({'v': [1, 2]}))
+        self._export('t', '20200103', pd.DataFrame({'v': [3]}))
+
+        df = gcs.get_exported_table_df(
+            't', start='20200101', end='20200103', schema=False)
+
+        self.assertEqual(df['v'].tolist(), [1, 2, 3])
+        self.assertEqual(
+            df['date'].dt.strftime('%Y%m%d').tolist(),
+            ['20200101', '20200101', '20200103'])
+
+    def test_date_column_collision(self):
+        """Test that an existing column is not overwritten with dates."""
+        self._export('t', '20200101', pd.DataFrame({'date': ['x']}))
+
+        with self.assertRaises(ValueError):
+            gcs.get_exported_table_df(
+                't', start='20200101', end='20200101', schema=False)
+
+        df = gcs.get_exported_table_df(
+            't', start='20200101', end='20200101', schema=False,
+            date_column='export_date')
+        self.assertEqual(df['date'].tolist(), ['x'])
+
+
+class TestExportSchema(FakeBucketTestCase):
+    """Tests for typing CSV exports by their BigQuery schema."""
+
+    def setUp(self):
+        super().setUp()
+
+        prefix = 'e/exported_tables/t/20200101/'
+        self.bucket.objects[prefix + 'out.csv.gzip'] = gzip.compress(
+            b'id,amount,price,day,name\n'
+            b'1,12345678901234567890.123456789,0.1,2020-01-01,a\n'
+            b',,,,a\n')
+        self.bucket.objects[prefix + 'schema.json'] = json.dumps({
+            'fields': [
+                {'name': 'id', 'type': 'INTEGER'},
+                {'name': 'amount', 'type': 'NUMERIC'},
+                {'name': 'price', 'type': 'FLOAT'},
+                {'name': 'day', 'type': 'DATE'},
+                {'name': 'name', 'type': 'STRING'}]}).encode('utf-8')
+
+    def test_schema(self):
+        """Test that columns are typed without losing precision."""
+        df = gcs.get_exported_table_df('t', date='20200101')
+
+        self.assertEqual(str(df['id'].dtype), 'Int64')
+        self.assertTrue(pd.isna(df['id'][1]))
+        self.assertEqual(
+            df['amount'][0], Decimal('12345678901234567890.123456789'))
+        self.assertIsNone(df['amount'][1])
+        self.assertEqual(str(df['price'].dtype), 'float64')
+        self.assertEqual(df['day'][0], pd.Timestamp('2020-01-01'))
+
+    def test_downcast(self):
+        """Test that floats are downcast only when asked."""
+        df = gcs.get_exported_table_df(
+            't', date='20200101', downcast=True)
+
+        self.assertEqual(str(df['price'].dtype), 'float32')
+        self.assertEqual(df['amount'].dtype, object)
+        self.assertEqual(str(df['name'].dtype), 'category')
+        self.assertEqual(
+            df['amount'][0], Decimal('12345678901234567890.123456789'))
+
+
+class TestExportCache(unittest.TestCase):
+    """Tests for `fuga.gcs.ExportCache`."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.bucket = FakeBucket()
+        for name in ['a', 'b', 'c']:
+            self.bucket.objects[name + '.csv.gzip'] = name.encode() * 10
+        self.cache = gcs.ExportCache(self.tmp_dir, max_bytes=25)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _blob(self, name):
+        return self.bucket.get_blob(name + '.csv.gzip')
+
+    def _cached(self):
+        cached = []
+        for name in ['a', 'b', 'c']:
+            if os.path.exists(self.cache._entry_path(self._blob(name))):
+                cached.append(name)
+        return cached
+
+    def test_hit(self):
+        """Test that blobs are downloaded only on a miss."""
+        blob = self._blob('a')
+        with mock.patch.object(
+                blob, 'download_to_filename',
+                wraps=blob.download_to_filename) as download:
+            path = self.cache.get_path(blob)
+            self.assertEqual(self.cache.get_path(blob), path)
+        self.assertEqual(download.call_count, 1)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'a' * 10)
+
+    def test_new_generation(self):
+        """Test that overwritten blobs miss the cache."""
+        path = self.cache.get_path(self._blob('a'))
+        self.bucket.objects['a.csv.gzip'] = b'new'
+        new_path = self.cache.get_path(self._blob('a'))
+
+        self.assertNotEqual(new_path, path)
+        with open(new_path, 'rb') as f:
+            self.assertEqual(f.read(), b'new')
+
+    def test_evict_least_recently_used(self):
+        """Test that least recently used entries are evicted."""
+        a = self.cache.get_path(self._blob('a'))
+        self.cache.get_path(self._blob('b'))
+        os.utime(a, (0, 0))
+        self.cache.get_path(self._blob('b'))
+        self.cache.get_path(self._blob('c'))
+
+        self.assertEqual(self._cached(), ['b', 'c'])
+
+    def test_keep_in_use(self):
+        """Test that entries in use are not evicted by other fills."""
+        with self.cache.use(self._blob('a')) as a, \
+                self.cache.use(self._blob('b')):
+            os.utime(a, (0, 0))
+            self.cache.get_path(self._blob('c'))
+            self.assertEqual(self._cached(), ['a', 'b', 'c'])
+
+        self.cache.evict()
+        self.assertEqual(self._cached(), ['b', 'c'])
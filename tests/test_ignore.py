@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `fuga.ignore` module."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from fuga.ignore import DEFAULT_PATTERNS, IgnoreMatcher
+
+
+class TestIgnoreMatcher(unittest.TestCase):
+    """Tests for `fuga.ignore.IgnoreMatcher`."""
+
+    def test_unanchored(self):
+        """Test that patterns without a slash match at any level."""
+        matcher = IgnoreMatcher(['*.log'])
+        self.assertTrue(matcher.match('a.log'))
+        self.assertTrue(matcher.match('py/logs/a.log'))
+        self.assertFalse(matcher.match('a.log.txt'))
+
+    def test_anchored(self):
+        """Test that patterns with a slash match relative to the root."""
+        matcher = IgnoreMatcher(['/build', 'py/tmp'])
+        self.assertTrue(matcher.match('build', is_dir=True))
+        self.assertFalse(matcher.match('py/build', is_dir=True))
+        self.assertTrue(matcher.match('py/tmp'))
+        self.assertFalse(matcher.match('sql/py/tmp'))
+
+    def test_wildcards(self):
+        """Test that `*` doesn't match slashes while `**` does."""
+        matcher = IgnoreMatcher(['py/*.csv', 'sql/**/test_*.sql', 'data/**'])
+        self.assertTrue(matcher.match('py/a.csv'))
+        self.assertFalse(matcher.match('py/data/a.csv'))
+        self.assertTrue(matcher.match('sql/test_a.sql'))
+        self.assertTrue(matcher.match('sql/a/b/test_a.sql'))
+        self.assertFalse(matcher.match('sql/a/b/a.sql'))
+        self.assertTrue(matcher.match('data/a/b.csv'))
+
+    def test_character_classes(self):
+        """Test `?` and bracket expressions."""
+        matcher = IgnoreMatcher(['?.txt', '*.py[co]', 'v[!0-9]'])
+        self.assertTrue(matcher.match('a.txt'))
+        self.assertFalse(matcher.match('ab.txt'))
+        self.assertTrue(matcher.match('a.pyc'))
+        self.assertFalse(matcher.match('a.py'))
+        self.assertTrue(matcher.match('va'))
+        self.assertFalse(matcher.match('v1'))
+
+    def test_directory_only(self):
+        """Test that patterns ending with a slash match only directories."""
+        matcher = IgnoreMatcher(['tmp/'])
+        self.assertTrue(matcher.match('tmp', is_dir=True))
+        self.assertTrue(matcher.match('py/tmp', is_dir=True))
+        self.assertFalse(matcher.match('tmp'))
+        self.assertTrue(matcher.is_ignored(os.path.join('tmp', 'a.py')))
+
+    def test_negation(self):
+        """Test that later `!` patterns re-include earlier matches."""
+        matcher = IgnoreMatcher(['*.sql', '!keep.sql', '# comment', ''])
+        self.assertTrue(matcher.match('a.sql'))
+        self.assertFalse(matcher.match('keep.sql'))
+        self.assertTrue(IgnoreMatcher(['!a.sql', 'a.sql']).match('a.sql'))
+
+    def test_empty(self):
+        """Test that nothing is matched without patterns."""
+        self.assertFalse(IgnoreMatcher([]).match('a.py'))
+
+    def test_hidden_files_by_default(self):
+        """Test that hidden files are ignored unless re-included."""
+        matcher = IgnoreMatcher(DEFAULT_PATTERNS)
+        self.assertTrue(matcher.match('py/.env'))
+        self.assertTrue(matcher.match('.git', is_dir=True))
+        self.assertFalse(matcher.match('py/a.py'))
+
+        matcher = IgnoreMatcher(DEFAULT_PATTERNS + ['!.airflowignore'])
+        self.assertFalse(matcher.match('py/.airflowignore'))
+        self.assertTrue(matcher.match('py/.env'))
+
+
+class TestIgnoreMatcherWalk(unittest.TestCase):
+    """Tests for `fuga.ignore.IgnoreMatcher.walk`."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for path in [
+                'py/dag.py',
+                'py/.env',
+                'py/__pycache__/dag.cpython-37.pyc',
+                'py/lib/util.py',
+                'py/lib/build/out.py',
+                'py/data/a.csv',
+                'py/data/keep.csv',
+                'sql/.credentials',
+                'sql/query.sql']:
+            path = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+
+        with open(os.path.join(self.root, '.fugaignore'), 'w') as f:
+            f.write('build/\npy/data/*\n!py/data/keep.csv\n')
+        self.matcher = IgnoreMatcher.from_directory(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _walk(self, target):
+        return [
+            os.path.relpath(path, self.root)
+            for path in self.matcher.walk(
+                self.root, os.path.join(self.root, target))]
+
+    def test_walk(self):
+        """Test that only files not ignored are yielded in order."""
+        self.assertEqual(self._walk('py'), [
+            os.path.join('py', 'dag.py'),
+            os.path.join('py', 'data', 'keep.csv'),
+            os.path.join('py', 'lib', 'util.py')])
+        self.assertEqual(self._walk('sql'), [os.path.join('sql', 'query.sql')])
+
+    def test_walk_missing(self):
+        """Test that missing targets yield nothing."""
+        self.assertEqual(self._walk('pod_operators'), [])
+
+    def test_prune(self):
+        """Test that ignored directories are never visited."""
+        scandir = os.scandir
+        visited = []
+
+        def record(path):
+            visited.append(os.path.relpath(path, self.root))
+            return scandir(path)
+
+        with mock.patch('os.scandir', side_effect=record):
+            list(self.matcher.walk(self.root, os.path.join(self.root, 'py')))
+
+        self.assertNotIn(os.path.join('py', '__pycache__'), visited)
+        self.assertNotIn(os.path.join('py', 'lib', 'build'), visited)
+        self.assertIn(os.path.join('py', 'lib'), visited)
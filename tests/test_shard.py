@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `fuga.shard` module."""
+
+
+import os
+from unittest import mock
+
+import pandas as pd
+
+from fuga import gcs
+from fuga import shard
+from tests.fakes import FakeBucketTestCase
+
+
+class TestShard(FakeBucketTestCase):
+    """Tests for `fuga.shard` module."""
+
+    experiment_name = 'experiment'
+    env = {
+        'FUGA_EXECUTION_DATE': '20200101',
+        shard.SHARD_COUNT_ENV: '3',
+        shard.SHARD_OUTPUT_NAME_ENV: 'scores'}
+
+    def _save_shards(self, dfs, **kwargs):
+        for i, df in enumerate(dfs):
+            with mock.patch.dict(os.environ, {shard.SHARD_INDEX_ENV: str(i)}):
+                shard.save_shard_df(df, **kwargs)
+
+    def test_shard_range(self):
+        """Test that ranges of shards cover all rows without overlaps."""
+        ranges = [shard.shard_range(10, i, 3) for i in range(3)]
+        self.assertEqual(ranges, [(0, 3), (3, 6), (6, 10)])
+
+    def test_list_shard_blobs(self):
+        """Test that every blob is assigned to exactly one shard."""
+        for i, size in enumerate([100, 50, 50, 30, 20, 10]):
+            self.bucket.objects['input/%d' % i] = b'x' * size
+
+        names = [
+            [blob.name for blob in shard.list_shard_blobs(
+                'gs://bucket/input/', shard_index=i, shard_count=3)]
+            for i in range(3)]
+
+        self.assertEqual(
+            sorted(sum(names, [])),
+            sorted(self.bucket.objects))
+        self.assertEqual(names[0], ['input/0'])
+
+    def test_gather(self):
+        """Test that outputs of shards are concatenated."""
+        self._save_shards([pd.DataFrame({'v': [i, i]}) for i in range(3)])
+
+        shard.gather_shard_dfs('scores', 3, '20200101')
+
+        df = gcs.load_df('scores', date='20200101')
+        self.assertEqual(df['v'].tolist(), [0, 0, 1, 1, 2, 2])
+
+    def test_gather_empty_shards(self):
+        """Test that empty outputs of shards are skipped."""
+        self._save_shards([
+            pd.DataFrame({'v': [0]}),
+            pd.DataFrame({'v': []}),
+            pd.DataFrame({'v': [2]})])
+        # Output saved without a header row
+        self.bucket.objects[
+            'experiment/output/20200101/scores-shard-00001.csv'] = b''
+
+        shard.gather_shard_dfs('scores', 3, '20200101')
+
+        df = gcs.load_df('scores', date='20200101')
+        self.assertEqual(df['v'].tolist(), [0, 2])
+
+    def test_gather_all_empty_shards(self):
+        """Test that empty outputs of all shards make an empty output."""
+        self._save_shards([pd.DataFrame({'v': []}) for _ in range(3)])
+
+        shard.gather_shard_dfs('scores', 3, '20200101')
+
+        df = gcs.load_df('scores', date='20200101')
+        self.assertEqual(list(df.columns), ['v'])
+        self.assertEqual(len(df), 0)
+
+    def test_gather_large_output(self):
+        """Test that outputs larger than a save chunk are gathered."""
+        self._save_shards([
+            pd.DataFrame({'v': range(i * 1000, (i + 1) * 1000)})
+            for i in range(3)])
+
+        key = shard.gather_shard_dfs(
+            'scores', 3, '20200101', chunksize=500)
+
+        self.assertEqual(self.bucket.streamed, [key])
+        df = gcs.load_df('scores', date='20200101')
+        self.assertEqual(df['v'].tolist(), list(range(3000)))